@@ -4,6 +4,8 @@ import hashlib
 from components.chat_layout import render_chats_page
 from components.analytics_panel import render_analytics_page
 from components.content_panel import render_content_page
+from components.portfolio_panel import render_portfolio_page
+from core.data import get_prefetcher
 
 # Конфигурация страницы
 st.set_page_config(
@@ -237,6 +239,8 @@ def render_logout_button():
     """Кнопка выхода"""
     st.sidebar.markdown("---")
     if st.sidebar.button("🚪 Выйти из аккаунта", use_container_width=True, type="secondary"):
+        if "prefetch_scope" in st.session_state:
+            get_prefetcher().cancel(st.session_state["prefetch_scope"])
         st.session_state.clear()
         st.rerun()
 
@@ -311,6 +315,7 @@ def main():
         "💬 Чаты": ("chats", "chats_page"),
         "🎥 Контент": ("content", "content_page"),
         "📊 Аналитика": ("analytics", "analytics_page"),
+        "🗂 Портфель": ("analytics", "portfolio_page"),
     }
     
     for page_name, (feature, page_key) in pages.items():
@@ -363,6 +368,12 @@ def main():
         else:
             render_upgrade_notice("Аналитика")
 
+    elif current_page == "portfolio_page":
+        if check_feature_access("analytics"):
+            render_portfolio_page(available_accounts)
+        else:
+            render_upgrade_notice("Аналитика")
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
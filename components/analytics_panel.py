@@ -1,8 +1,31 @@
 # components/analytics_panel.py
+import html
 import streamlit as st
+import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from core.data import get_analytics_data
+from datetime import date, timedelta
+from core.data import get_analytics_data, get_forecast, get_kpis, get_top_fans, get_week_achievements
+from core.forecast import BAND_Z, goal_probability
+from core.chart_cache import cached_figure
+from core.downsample import downsample
+from core.utils import get_settings
+
+
+TOP_FANS_WINDOWS = {
+    "week": "Эта неделя",
+    "all": "Всё время",
+}
+
+# Насколько вперёд можно выбрать конец периода (для прогноза)
+FORECAST_MAX_DAYS = 31
+
+GRANULARITY_LABELS = {
+    "day": "По дням",
+    "hour": "По часам",
+    "week": "По неделям",
+    "month": "По месяцам",
+}
 
 
 def render_analytics_page(account: str):
@@ -24,9 +47,40 @@ def render_analytics_page(account: str):
     if "target_subs" not in st.session_state:
         st.session_state.target_subs = 80
 
+    # Период и шаг агрегации
+    today = date.today()
+    col_range, col_gran = st.columns([2, 1])
+    with col_range:
+        date_range = st.date_input(
+            "📅 Период",
+            value=(today - timedelta(days=6), today),
+            max_value=today + timedelta(days=FORECAST_MAX_DAYS),
+            key="analytics_range"
+        )
+    with col_gran:
+        granularity = st.selectbox(
+            "Шаг",
+            list(GRANULARITY_LABELS),
+            format_func=GRANULARITY_LABELS.get,
+            key="analytics_granularity"
+        )
+
+    # Пока выбрана только первая дата диапазона, показываем один день
+    if isinstance(date_range, (tuple, list)):
+        start_date = date_range[0] if date_range else today
+        end_date = date_range[1] if len(date_range) > 1 else start_date
+    else:
+        start_date = end_date = date_range
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+    # Будущие дни периода идут только в прогноз, факты — по сегодняшний день
+    fact_end = min(end, pd.Timestamp(today) + pd.Timedelta(days=1))
+    max_points = get_settings().chart_max_points
+
     # Загрузка данных
     try:
-        data = get_analytics_data(account)
+        data = get_analytics_data(account, start, fact_end, granularity)
+        kpis = get_kpis(account, start, fact_end)
         if data.empty:
             st.warning("⚠️ Нет данных для отображения аналитики")
             return
@@ -34,20 +88,14 @@ def render_analytics_page(account: str):
         st.error(f"❌ Ошибка загрузки данных: {str(e)}")
         return
 
-    # Расчет метрик
-    total_rev = int(data["revenue"].sum()) if "revenue" in data.columns else 0
-    total_subs = int(data["subs"].iloc[-1]) if "subs" in data.columns and len(data) > 0 else 0
-    avg_watch = float(data["avg_watch"].mean()) if "avg_watch" in data.columns else 0.0
-
-    # Расчет изменений
-    if len(data) >= 2:
-        prev_rev = int(data["revenue"].iloc[-2]) if "revenue" in data.columns else 0
-        prev_subs = int(data["subs"].iloc[-2]) if "subs" in data.columns else 0
-        rev_delta = total_rev - prev_rev
-        subs_delta = total_subs - prev_subs
-    else:
-        rev_delta = 0
-        subs_delta = 0
+    # Метрики берутся из материализованных дневных агрегатов (O(1))
+    total_rev = int(round(kpis["revenue"]))
+    total_subs = int(kpis["last_day_subs"])
+    avg_watch = float(kpis["avg_watch"])
+
+    # Изменения: доход — к предыдущему такому же периоду, подписчики — ко вчерашнему дню
+    rev_delta = total_rev - int(round(kpis["prev_revenue"]))
+    subs_delta = total_subs - int(kpis["prev_day_subs"])
 
     # Стили
     st.markdown("""
@@ -129,6 +177,7 @@ def render_analytics_page(account: str):
         .rank-1 { background: linear-gradient(135deg, #FFD700 0%, #FFA500 100%); color: #000; }
         .rank-2 { background: linear-gradient(135deg, #C0C0C0 0%, #808080 100%); color: #000; }
         .rank-3 { background: linear-gradient(135deg, #CD7F32 0%, #8B4513 100%); color: #fff; }
+        .rank-other { background: rgba(255, 255, 255, 0.1); color: #fff; }
         </style>
     """, unsafe_allow_html=True)
 
@@ -168,11 +217,11 @@ def render_analytics_page(account: str):
     tab1, tab2, tab3 = st.tabs(["📈 Доход и подписчики", "⏰ Время на стриме", "📊 Сравнение"])
 
     with tab1:
-        fig = _create_revenue_subs_chart(data)
+        fig = _create_revenue_subs_chart(data, max_points)
         st.plotly_chart(fig, use_container_width=True)
 
     with tab2:
-        fig2 = _create_watch_time_chart(data)
+        fig2 = _create_watch_time_chart(data, max_points)
         st.plotly_chart(fig2, use_container_width=True)
 
     with tab3:
@@ -189,6 +238,8 @@ def render_analytics_page(account: str):
     # ===== ГЕЙМИФИКАЦИЯ =====
     st.markdown("### 🎯 Цели и прогресс")
 
+    forecast = get_forecast(account, start, end)
+
     col_plan1, col_plan2 = st.columns(2)
 
     with col_plan1:
@@ -224,6 +275,9 @@ def render_analytics_page(account: str):
             </div>
         """, unsafe_allow_html=True)
 
+        rev_fc = forecast["revenue"]
+        _render_forecast(rev_fc["total"], rev_fc["total_sd"], target_rev, "${:,.0f}")
+
     with col_plan2:
         target_subs = st.number_input(
             "🎯 Цель по подписчикам на неделю",
@@ -257,33 +311,48 @@ def render_analytics_page(account: str):
             </div>
         """, unsafe_allow_html=True)
 
+        # Прогресс по подписчикам считается по последнему дню периода — прогноз тоже
+        subs_fc = forecast["subs"]
+        _render_forecast(subs_fc["last_day"], subs_fc["last_day_sd"], target_subs, "{:,.0f}")
+
     st.markdown("---")
 
     # ===== ТОПЫ И ДОСТИЖЕНИЯ =====
     col_t1, col_t2 = st.columns(2)
 
     with col_t1:
-        st.markdown("### 🏆 ТОП-3 Фанов по донатам")
+        col_k, col_window = st.columns(2)
+        with col_k:
+            top_k = st.selectbox("Сколько фанов", [3, 5, 10], key="top_fans_k")
+        with col_window:
+            top_window = st.radio(
+                "Окно",
+                list(TOP_FANS_WINDOWS),
+                format_func=TOP_FANS_WINDOWS.get,
+                horizontal=True,
+                key="top_fans_window",
+                label_visibility="collapsed"
+            )
+        st.markdown(f"### 🏆 ТОП-{top_k} Фанов по донатам")
         
-        top_fans = [
-            {"rank": 1, "name": "Mike", "badge": "🔥", "amount": 450},
-            {"rank": 2, "name": "Dave", "badge": "", "amount": 300},
-            {"rank": 3, "name": "Alex", "badge": "💎", "amount": 180},
-        ]
+        top_fans = get_top_fans(account, k=top_k, window=top_window)
+        if not top_fans:
+            st.info("Пока нет донатов за выбранный период")
         
         for fan in top_fans:
+            rank_class = f"rank-{fan['rank']}" if fan["rank"] <= 3 else "rank-other"
             st.markdown(f"""
                 <div class="top-fan-card">
                     <div style="display: flex; align-items: center; gap: 12px;">
-                        <div class="rank-badge rank-{fan['rank']}">{fan['rank']}</div>
+                        <div class="rank-badge {rank_class}">{fan['rank']}</div>
                         <div>
                             <div style="font-weight: 600; font-size: 15px;">
-                                {fan['name']} {fan['badge']}
+                                {html.escape(fan['name'])}
                             </div>
                         </div>
                     </div>
                     <div style="font-weight: 700; color: #4CAF50; font-size: 16px;">
-                        ${fan['amount']}
+                        ${fan['amount']:,.0f}
                     </div>
                 </div>
             """, unsafe_allow_html=True)
@@ -291,11 +360,7 @@ def render_analytics_page(account: str):
     with col_t2:
         st.markdown("### 🏅 Достижения недели")
         
-        achievements = [
-            {"icon": "✅", "text": "Закрыт план по доходу 3/5 дней", "color": "#4CAF50"},
-            {"icon": "✅", "text": "2 стрима подряд с avg watch > 20 мин", "color": "#4CAF50"},
-            {"icon": "🎯", "text": "Новый рекорд по подписчикам за день: +15", "color": "#FFD700"},
-        ]
+        achievements = get_week_achievements(account, min(end_date, today), target_rev)
         
         if progress_rev >= 1.0:
             achievements.insert(0, {"icon": "🎉", "text": "Недельная цель по доходу выполнена!", "color": "#FF9800"})
@@ -303,6 +368,9 @@ def render_analytics_page(account: str):
         if progress_subs >= 1.0:
             achievements.insert(0, {"icon": "🎉", "text": "Недельная цель по подписчикам выполнена!", "color": "#FF9800"})
         
+        if not achievements:
+            st.caption("На этой неделе достижений пока нет")
+
         for achievement in achievements:
             st.markdown(f"""
                 <div class="achievement-card" style="border-left-color: {achievement['color']};">
@@ -332,14 +400,30 @@ def _render_metric_card(icon: str, label: str, value: str, delta, delta_suffix:
     """, unsafe_allow_html=True)
 
 
-def _create_revenue_subs_chart(data):
-    """Создание графика дохода и подписчиков"""
+def _render_forecast(projected: float, sd: float, target: float, fmt: str):
+    """Прогноз на конец периода с 80%-й полосой и шансом выполнить цель"""
+    if sd <= 0:
+        return
+    low = max(projected - BAND_Z * sd, 0)
+    high = projected + BAND_Z * sd
+    chance = goal_probability(projected, sd, target) if target > 0 else 1.0
+    st.caption(
+        f"📈 Прогноз на конец периода: **{fmt.format(projected)}** "
+        f"({fmt.format(low)} – {fmt.format(high)}, 80%) · шанс выполнить цель: **{chance*100:.0f}%**"
+    )
+
+
+@cached_figure
+def _create_revenue_subs_chart(data, max_points: int = 500):
+    """Создание графика дохода и подписчиков (каждая линия прорежена до max_points)"""
     fig = go.Figure()
+    revenue = downsample(data, "day", "revenue", max_points)
+    subs = downsample(data, "day", "subs", max_points)
     
     # Доход
     fig.add_trace(go.Scatter(
-        x=data["day"],
-        y=data["revenue"],
+        x=revenue["day"],
+        y=revenue["revenue"],
         name="Доход ($)",
         line=dict(color="#4CAF50", width=3),
         fill='tozeroy',
@@ -348,8 +432,8 @@ def _create_revenue_subs_chart(data):
     
     # Подписчики
     fig.add_trace(go.Scatter(
-        x=data["day"],
-        y=data["subs"],
+        x=subs["day"],
+        y=subs["subs"],
         name="Подписчики",
         line=dict(color="#667eea", width=3),
         yaxis="y2"
@@ -370,10 +454,11 @@ def _create_revenue_subs_chart(data):
     return fig
 
 
-def _create_watch_time_chart(data):
-    """Создание графика времени просмотра"""
+@cached_figure
+def _create_watch_time_chart(data, max_points: int = 500):
+    """Создание графика времени просмотра (min/max-прореживание до max_points)"""
     fig = px.bar(
-        data,
+        downsample(data, "day", "avg_watch", max_points, method="minmax"),
         x="day",
         y="avg_watch",
         title="Среднее время зрителя на стриме (мин)",
@@ -393,6 +478,7 @@ def _create_watch_time_chart(data):
     return fig
 
 
+@cached_figure
 def _create_revenue_pie_chart(data):
     """Создание круговой диаграммы распределения дохода"""
     if len(data) == 0:
@@ -421,6 +507,7 @@ def _create_revenue_pie_chart(data):
     return fig
 
 
+@cached_figure
 def _create_growth_indicator(revenue: int, subs: int):
     """Создание индикаторов роста"""
     fig = go.Figure()
@@ -1,25 +1,139 @@
 # components/chat_layout.py
 import streamlit as st
-from core.data import get_fans_df, get_chat_history
+from core.data import (
+    get_fan,
+    get_fan_store,
+    get_chat_history,
+    get_outbox,
+    prefetch_chat_histories,
+    search_fans,
+    send_message,
+)
+from core.outbox import FAILED, PENDING, SENDING, SENT
 from core.ai import ai_warmup_suggestion
-import time
+from core.cache import TTLCache
+import html
+import uuid
 
 
+# Сколько сообщений грузить за одну страницу истории
+CHAT_PAGE_SIZE = 50
+
+# Сколько фанов рисовать на одной странице списка
+FANS_PAGE_SIZE = 20
+
+FAN_SORT_LABELS = {
+    "revenue": "💰 По доходу",
+    "unread": "🔴 Сначала непрочитанные",
+    "name": "🔤 По имени",
+}
+
+SEGMENT_ICONS = {"VIP": "💎", "Buyer": "💰", "Free": "👤"}
+
+# Сколько следующих вероятных фанов прогревать в фоне
+PREFETCH_TOP_K = 5
+
+# Готовый HTML переписки: общий на процесс, ключ — (account, fan_id, first_id, last_id, count)
+_transcript_cache = TTLCache(ttl=3600, maxsize=512)
+
+_CHAT_CSS = """<style>
+.chat-history {
+    max-height: 550px;
+    overflow-y: auto;
+    padding: 16px;
+    border-radius: 12px;
+    background: linear-gradient(180deg, rgba(17, 17, 17, 0.95) 0%, rgba(30, 30, 30, 0.95) 100%);
+    border: 1px solid rgba(255, 255, 255, 0.1);
+    box-shadow: inset 0 2px 8px rgba(0, 0, 0, 0.3);
+}
+.chat-history::-webkit-scrollbar {
+    width: 6px;
+}
+.chat-history::-webkit-scrollbar-track {
+    background: rgba(255, 255, 255, 0.05);
+    border-radius: 10px;
+}
+.chat-history::-webkit-scrollbar-thumb {
+    background: rgba(102, 126, 234, 0.5);
+    border-radius: 10px;
+}
+.chat-history::-webkit-scrollbar-thumb:hover {
+    background: rgba(102, 126, 234, 0.7);
+}
+.msg-user {
+    text-align: right;
+    margin-bottom: 12px;
+    animation: slideInRight 0.3s ease;
+}
+.msg-bubble-user {
+    display: inline-block;
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    color: #fff;
+    padding: 10px 14px;
+    border-radius: 18px 18px 4px 18px;
+    font-size: 14px;
+    max-width: 75%;
+    word-wrap: break-word;
+    box-shadow: 0 2px 8px rgba(102, 126, 234, 0.3);
+}
+.msg-assistant {
+    text-align: left;
+    margin-bottom: 12px;
+    animation: slideInLeft 0.3s ease;
+}
+.msg-bubble-assistant {
+    display: inline-block;
+    background: rgba(66, 66, 66, 0.8);
+    color: #fff;
+    padding: 10px 14px;
+    border-radius: 18px 18px 18px 4px;
+    font-size: 14px;
+    max-width: 75%;
+    word-wrap: break-word;
+    border: 1px solid rgba(255, 255, 255, 0.1);
+    box-shadow: 0 2px 8px rgba(0, 0, 0, 0.2);
+}
+.msg-time {
+    font-size: 10px;
+    color: #888;
+    margin-top: 4px;
+    font-style: italic;
+}
+@keyframes slideInRight {
+    from {
+        opacity: 0;
+        transform: translateX(20px);
+    }
+    to {
+        opacity: 1;
+        transform: translateX(0);
+    }
+}
+@keyframes slideInLeft {
+    from {
+        opacity: 0;
+        transform: translateX(-20px);
+    }
+    to {
+        opacity: 1;
+        transform: translateX(0);
+    }
+}
+</style>
+"""
+
 
 def render_chats_page(account: str) -> None:
     st.header(f"💬 Чаты: {account}")
 
-    # Инициализация выбранного фана
-    if "selected_fan_id" not in st.session_state:
-        fans_temp = get_fans_df(account)
-        if not fans_temp.empty:
-            st.session_state["selected_fan_id"] = fans_temp.iloc[0]["id"]
-        else:
-            st.session_state["selected_fan_id"] = None
+    fans = get_fan_store(account)
 
-    fans = get_fans_df(account)
+    # Инициализация выбранного фана (выбранный фан другого аккаунта сбрасывается)
+    selected = st.session_state.get("selected_fan_id")
+    if selected is None or selected not in fans:
+        st.session_state["selected_fan_id"] = None
     
-    if fans.empty:
+    if len(fans) == 0:
         st.warning("Нет доступных фанов")
         return
 
@@ -29,45 +143,91 @@ def render_chats_page(account: str) -> None:
     with col_list:
         st.markdown("### 👥 Фаны")
         
-        segment_filter = st.multiselect(
-            "Фильтр по сегментам",
-            ["VIP", "Buyer", "Free"],
-            default=[],
-            key="segment_filter"
+        search_query = st.text_input(
+            "Поиск по имени",
+            placeholder="🔍 Имя фана",
+            key="fan_search_query"
         )
-        
-        # Если фильтр пустой - показываем всех
-        if segment_filter:
-            filtered = fans[fans["segment"].isin(segment_filter)]
-        else:
-            filtered = fans
-        
-        if filtered.empty:
-            st.info("Нет фанов с выбранными сегментами")
+
+        col_seg, col_sort = st.columns(2)
+        with col_seg:
+            segment_filter = st.multiselect(
+                "Фильтр по сегментам",
+                ["VIP", "Buyer", "Free"],
+                default=[],
+                key="segment_filter"
+            )
+        with col_sort:
+            sort_by = st.selectbox(
+                "Сортировка",
+                list(FAN_SORT_LABELS),
+                format_func=FAN_SORT_LABELS.get,
+                key="fan_sort"
+            )
+
+        # При смене фильтров возвращаемся на первую страницу
+        filter_signature = (search_query, tuple(segment_filter), sort_by)
+        if st.session_state.get("fans_filter_signature") != filter_signature:
+            st.session_state["fans_filter_signature"] = filter_signature
+            st.session_state["fans_page"] = 0
+
+        page = st.session_state.get("fans_page", 0)
+        page_fans, total = search_fans(
+            account,
+            query=search_query,
+            segments=segment_filter,
+            sort_by=sort_by,
+            offset=page * FANS_PAGE_SIZE,
+            limit=FANS_PAGE_SIZE,
+        )
+
+        if total and page_fans.empty:
+            # Список сократился — переходим на последнюю существующую страницу
+            page = (total - 1) // FANS_PAGE_SIZE
+            st.session_state["fans_page"] = page
+            page_fans, total = search_fans(
+                account,
+                query=search_query,
+                segments=segment_filter,
+                sort_by=sort_by,
+                offset=page * FANS_PAGE_SIZE,
+                limit=FANS_PAGE_SIZE,
+            )
+
+        if total == 0:
+            st.info("Нет фанов по заданным условиям")
         else:
-            # Проверка валидности выбранного фана
-            if st.session_state["selected_fan_id"] not in filtered["id"].values:
-                st.session_state["selected_fan_id"] = filtered.iloc[0]["id"]
-            
-            _render_fans_list(filtered)
+            if st.session_state["selected_fan_id"] is None:
+                st.session_state["selected_fan_id"] = int(page_fans.iloc[0]["id"])
+
+            _render_fans_list(page_fans)
+            _render_fans_pager(page, total)
 
     # Получаем текущего фана
     if st.session_state["selected_fan_id"] is None:
         st.warning("Выберите фана из списка")
         return
         
-    current_fan_df = fans[fans["id"] == st.session_state["selected_fan_id"]]
-    if current_fan_df.empty:
+    current_fan = get_fan(account, st.session_state["selected_fan_id"])
+    if current_fan is None:
         st.error("Выбранный фан не найден")
         return
         
-    current_fan = current_fan_df.iloc[0]
-    history = get_chat_history(current_fan["id"])
+    history, has_older = _load_chat_history(account, current_fan["id"])
 
     # ===== ЦЕНТР: ЧАТ =====
     with col_chat:
         st.markdown(f"### 💬 Чат с **{current_fan['name']}**")
-        _render_chat_history(history)
+        if has_older and st.button(
+            "⬆️ Загрузить более ранние",
+            use_container_width=True,
+            type="secondary",
+            key="load_older_messages",
+        ):
+            _load_older_messages(account, current_fan["id"], history[0]["id"])
+            st.rerun()
+        _render_chat_history(history, cache_key=(account, current_fan["id"]))
+        _render_outbox_status(account, current_fan["id"])
 
     # ===== ПРАВАЯ КОЛОНКА: ОТВЕТ + AI =====
     with col_reply:
@@ -79,6 +239,9 @@ def render_chats_page(account: str) -> None:
                 st.session_state["ai_suggestion"] = suggestion
                 st.rerun()
 
+        # Ключ идемпотентности текущего черновика: двойной клик не отправит дубль
+        st.session_state.setdefault("reply_idempotency_key", uuid.uuid4().hex)
+
         default_text = st.session_state.get("ai_suggestion", "")
         reply_text = st.text_area(
             "Сообщение",
@@ -96,11 +259,14 @@ def render_chats_page(account: str) -> None:
                 type="primary",
                 disabled=not reply_text.strip(),
             ):
-                # МОК: эмулируем отправку
-                with st.spinner("Отправляю…"):
-                    time.sleep(0.8)  # вернёт красивый эффект, апп работает как мок
-
-                st.success("✅ Сообщение отправлено")
+                # Отправка идёт в фоне через outbox, rerun не блокируется
+                send_message(
+                    account,
+                    current_fan["id"],
+                    reply_text.strip(),
+                    idempotency_key=st.session_state.get("reply_idempotency_key"),
+                )
+                st.session_state["reply_idempotency_key"] = uuid.uuid4().hex
 
                 # Чистим только ai_suggestion, сам текст очистится после rerun
                 if "ai_suggestion" in st.session_state:
@@ -127,6 +293,73 @@ def render_chats_page(account: str) -> None:
         # Информационная карточка фана
         _render_fan_info_card(current_fan)
 
+    # Страница отрисована — прогреваем истории следующих вероятных фанов
+    _prefetch_next_fans(account, fans, segment_filter, current_fan["id"])
+
+
+def _prefetch_next_fans(account: str, fans, segment_filter, current_fan_id: int) -> None:
+    """Фоновый прогрев истории для топ-K непрочитанных/VIP фанов текущего фильтра"""
+    scope = st.session_state.setdefault("prefetch_scope", uuid.uuid4().hex)
+    next_ids = fans.likely_next(segment_filter, k=PREFETCH_TOP_K, exclude=current_fan_id)
+    prefetch_chat_histories(scope, account, next_ids, limit=CHAT_PAGE_SIZE)
+
+
+def _render_outbox_status(account: str, fan_id: int) -> None:
+    """Статусы сообщений, которые ещё в очереди на отправку или упали"""
+    outbox = get_outbox()
+    status_view = {
+        PENDING: ("⏳", "В очереди", "#ff9800"),
+        SENDING: ("📤", "Отправляется", "#667eea"),
+        FAILED: ("❌", "Не отправлено", "#f44336"),
+    }
+    for message in outbox.messages(account, fan_id):
+        if message.status == SENT:
+            continue
+        icon, label, color = status_view[message.status]
+        col_msg, col_action = st.columns([4, 1])
+        with col_msg:
+            st.markdown(f"""
+                <div style="font-size: 12px; padding: 6px 10px; border-left: 3px solid {color}; margin: 4px 0;">
+                    {icon} <span style="color: {color};">{label}</span> · {html.escape(message.text[:80])}
+                </div>
+            """, unsafe_allow_html=True)
+        with col_action:
+            if message.status != FAILED:
+                continue
+            col_retry, col_dismiss = st.columns(2)
+            with col_retry:
+                if st.button("🔁", key=f"retry_{message.key}", help=message.error):
+                    outbox.retry(message.key)
+                    st.rerun()
+            with col_dismiss:
+                if st.button("✖", key=f"dismiss_{message.key}", help="Убрать из очереди"):
+                    outbox.dismiss(message.key)
+                    st.rerun()
+
+
+def _load_chat_history(account: str, fan_id: int) -> tuple[list, bool]:
+    """
+    Последняя страница истории, а после «Загрузить более ранние» — весь диапазон
+    от самого старого подгруженного сообщения до свежего одним запросом к ChatStore
+    (склейка двух страниц теряла сообщения, когда свежая страница сдвигалась).
+    Возвращает (сообщения, есть ли ещё более ранние).
+    """
+    older_state = st.session_state.setdefault("chat_older", {}).get((account, fan_id))
+    if older_state is None:
+        latest = get_chat_history(fan_id, account, limit=CHAT_PAGE_SIZE)
+        return latest, len(latest) >= CHAT_PAGE_SIZE
+    history = get_chat_history(fan_id, account, from_id=older_state["oldest_id"])
+    return history, older_state["has_more"]
+
+
+def _load_older_messages(account: str, fan_id: int, oldest_id: int) -> None:
+    """Подгрузить страницу сообщений старше oldest_id и сдвинуть курсор начала ленты"""
+    page = get_chat_history(fan_id, account, before_id=oldest_id, limit=CHAT_PAGE_SIZE)
+    st.session_state.setdefault("chat_older", {})[(account, fan_id)] = {
+        "oldest_id": page[0]["id"] if page else oldest_id,
+        "has_more": len(page) >= CHAT_PAGE_SIZE,
+    }
+
 
 def _render_fans_list(filtered_fans) -> None:
     """Отрисовка списка фанов с улучшенным дизайном"""
@@ -182,20 +415,24 @@ def _render_fans_list(filtered_fans) -> None:
         </style>
     """, unsafe_allow_html=True)
     
-    for _, row in filtered_fans.iterrows():
-        is_selected = row["id"] == st.session_state["selected_fan_id"]
-        
-        # Иконки и стили
-        segment_icon = {"VIP": "💎", "Buyer": "💰", "Free": "👤"}
-        badge_class = {"VIP": "badge-vip", "Buyer": "badge-buyer", "Free": "badge-free"}
-        card_class = {"VIP": "fan-card-vip", "Buyer": "fan-card-buyer", "Free": "fan-card-free"}
-        segment = row["segment"]
-        
-        new_indicator = "🔴 " if row["has_new"] else ""
-        
-        # Кнопка для каждого фана с применением стилей
-        button_label = f"{segment_icon[segment]} {new_indicator}{row['name']} · ${row['revenue']}"
-        
+    # Подписи собираем векторно по всей странице, без iterrows
+    new_indicator = filtered_fans["has_new"].map({True: "🔴 ", False: ""}).fillna("")
+    labels = (
+        filtered_fans["segment"].map(SEGMENT_ICONS).fillna("👤") + " "
+        + new_indicator
+        + filtered_fans["name"].astype(str)
+        + " · $" + filtered_fans["revenue"].map("{:,.0f}".format)
+    ).tolist()
+
+    badge_class = {"VIP": "badge-vip", "Buyer": "badge-buyer", "Free": "badge-free"}
+    card_class = {"VIP": "fan-card-vip", "Buyer": "fan-card-buyer", "Free": "fan-card-free"}
+    selected_id = st.session_state["selected_fan_id"]
+
+    for fan_id, segment, button_label in zip(
+        filtered_fans["id"].tolist(), filtered_fans["segment"].tolist(), labels
+    ):
+        is_selected = fan_id == selected_id
+
         # Применяем стили карточки через markdown
         st.markdown(f"""
             <div class="{card_class[segment]}" style="
@@ -208,9 +445,9 @@ def _render_fans_list(filtered_fans) -> None:
             ">
                 <div style="display: flex; justify-content: space-between; align-items: center;">
                     <div style="font-weight: 600;">
-                        {button_label}
+                        {html.escape(button_label)}
                     </div>
-                    <div class="{badge_class[segment]} fan-badge" style="background: {{'#FFD700' if segment == 'VIP' else '#4CAF50' if segment == 'Buyer' else '#9E9E9E'}}; color: {'#000' if segment == 'VIP' else '#fff'}">
+                    <div class="{badge_class[segment]} fan-badge" style="background: {'#FFD700' if segment == 'VIP' else '#4CAF50' if segment == 'Buyer' else '#9E9E9E'}; color: {'#000' if segment == 'VIP' else '#fff'}">
                         {segment}
                     </div>
                 </div>
@@ -219,11 +456,34 @@ def _render_fans_list(filtered_fans) -> None:
         
         if st.button(
             "Выбрать",
-            key=f"fan_{row['id']}",
+            key=f"fan_{fan_id}",
             use_container_width=True,
             type="primary" if is_selected else "secondary"
         ):
-            st.session_state["selected_fan_id"] = row["id"]
+            st.session_state["selected_fan_id"] = fan_id
+            st.rerun()
+
+
+def _render_fans_pager(page: int, total: int) -> None:
+    """Переключение страниц списка фанов"""
+    pages = max((total - 1) // FANS_PAGE_SIZE + 1, 1)
+    if pages <= 1:
+        return
+
+    col_prev, col_info, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("◀", key="fans_prev", use_container_width=True, disabled=page <= 0):
+            st.session_state["fans_page"] = page - 1
+            st.rerun()
+    with col_info:
+        st.markdown(
+            f'<div style="text-align: center; color: #aaa; font-size: 12px; padding-top: 8px;">'
+            f'{page + 1} / {pages} · {total} фанов</div>',
+            unsafe_allow_html=True
+        )
+    with col_next:
+        if st.button("▶", key="fans_next", use_container_width=True, disabled=page >= pages - 1):
+            st.session_state["fans_page"] = page + 1
             st.rerun()
 
 
@@ -248,123 +508,40 @@ def _render_fan_info_card(fan) -> None:
             </div>
             <div style="display: flex; justify-content: space-between; align-items: center;">
                 <span style="font-size: 13px; color: #aaa;">Общий доход</span>
-                <span style="font-weight: 700; color: #4CAF50; font-size: 16px;">${fan['revenue']}</span>
+                <span style="font-weight: 700; color: #4CAF50; font-size: 16px;">${fan['revenue']:,.0f}</span>
             </div>
         </div>
     """, unsafe_allow_html=True)
 
 
-def _render_chat_history(history) -> None:
-    """Отрисовка истории чата с улучшенным дизайном"""
-    st.markdown("""
-        <style>
-        .chat-history {
-            max-height: 550px;
-            overflow-y: auto;
-            padding: 16px;
-            border-radius: 12px;
-            background: linear-gradient(180deg, rgba(17, 17, 17, 0.95) 0%, rgba(30, 30, 30, 0.95) 100%);
-            border: 1px solid rgba(255, 255, 255, 0.1);
-            box-shadow: inset 0 2px 8px rgba(0, 0, 0, 0.3);
-        }
-        .chat-history::-webkit-scrollbar {
-            width: 6px;
-        }
-        .chat-history::-webkit-scrollbar-track {
-            background: rgba(255, 255, 255, 0.05);
-            border-radius: 10px;
-        }
-        .chat-history::-webkit-scrollbar-thumb {
-            background: rgba(102, 126, 234, 0.5);
-            border-radius: 10px;
-        }
-        .chat-history::-webkit-scrollbar-thumb:hover {
-            background: rgba(102, 126, 234, 0.7);
-        }
-        .msg-user {
-            text-align: right;
-            margin-bottom: 12px;
-            animation: slideInRight 0.3s ease;
-        }
-        .msg-bubble-user {
-            display: inline-block;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: #fff;
-            padding: 10px 14px;
-            border-radius: 18px 18px 4px 18px;
-            font-size: 14px;
-            max-width: 75%;
-            word-wrap: break-word;
-            box-shadow: 0 2px 8px rgba(102, 126, 234, 0.3);
-        }
-        .msg-assistant {
-            text-align: left;
-            margin-bottom: 12px;
-            animation: slideInLeft 0.3s ease;
-        }
-        .msg-bubble-assistant {
-            display: inline-block;
-            background: rgba(66, 66, 66, 0.8);
-            color: #fff;
-            padding: 10px 14px;
-            border-radius: 18px 18px 18px 4px;
-            font-size: 14px;
-            max-width: 75%;
-            word-wrap: break-word;
-            border: 1px solid rgba(255, 255, 255, 0.1);
-            box-shadow: 0 2px 8px rgba(0, 0, 0, 0.2);
-        }
-        .msg-time {
-            font-size: 10px;
-            color: #888;
-            margin-top: 4px;
-            font-style: italic;
-        }
-        @keyframes slideInRight {
-            from {
-                opacity: 0;
-                transform: translateX(20px);
-            }
-            to {
-                opacity: 1;
-                transform: translateX(0);
-            }
-        }
-        @keyframes slideInLeft {
-            from {
-                opacity: 0;
-                transform: translateX(-20px);
-            }
-            to {
-                opacity: 1;
-                transform: translateX(0);
-            }
-        }
-        </style>
-    """, unsafe_allow_html=True)
+def _render_chat_history(history, cache_key=None) -> None:
+    """
+    Отрисовка истории чата одним HTML-блоком (один элемент Streamlit вместо
+    отдельного st.markdown на каждое сообщение). Готовый HTML кешируется по
+    cache_key + границам истории, поэтому rerun без новых сообщений его не пересобирает.
+    """
+    if history and cache_key is not None:
+        key = (cache_key, history[0]["id"], history[-1]["id"], len(history))
+        payload = _transcript_cache.get_or_load(key, lambda: _build_chat_html(history))
+    else:
+        payload = _build_chat_html(history)
+    st.markdown(payload, unsafe_allow_html=True)
 
-    st.markdown('<div class="chat-history">', unsafe_allow_html=True)
 
+def _build_chat_html(history) -> str:
+    """Сборка стилей и всей переписки в одну экранированную HTML-строку"""
     if not history:
-        st.markdown(
-            '<div style="text-align: center; color: #666; padding: 40px;">Нет сообщений</div>',
-            unsafe_allow_html=True
-        )
+        body = '<div style="text-align: center; color: #666; padding: 40px;">Нет сообщений</div>'
     else:
+        parts = []
         for msg in history:
-            if msg["role"] == "user":
-                st.markdown(f"""
-                    <div class="msg-user">
-                        <div class="msg-bubble-user">{msg['text']}</div>
-                        <div class="msg-time">{msg['time']}</div>
-                    </div>
-                """, unsafe_allow_html=True)
-            else:
-                st.markdown(f"""
-                    <div class="msg-assistant">
-                        <div class="msg-bubble-assistant">{msg['text']}</div>
-                        <div class="msg-time">{msg['time']}</div>
-                    </div>
-                """, unsafe_allow_html=True)
-
-    st.markdown("</div>", unsafe_allow_html=True)
\ No newline at end of file
+            role = "user" if msg["role"] == "user" else "assistant"
+            text = html.escape(str(msg["text"])).replace("\n", "<br>")
+            parts.append(
+                f'<div class="msg-{role}">'
+                f'<div class="msg-bubble-{role}">{text}</div>'
+                f'<div class="msg-time">{html.escape(str(msg.get("time", "")))}</div>'
+                f'</div>'
+            )
+        body = "".join(parts)
+    return f'{_CHAT_CSS}<div class="chat-history">{body}</div>'
@@ -1,10 +1,39 @@
 # components/content_panel.py
+import time
 import streamlit as st
-from core.ai import (
-    fake_generate_images,
-    fake_generate_videos,
-    estimate_generation_cost,
+from core.ai import estimate_generation_cost
+from core.cost_ledger import BudgetExceededError
+from core.data import (
+    get_cost_ledger,
+    get_generation_budget,
+    get_job_queue,
+    get_lora_registry,
+    get_variant_price,
+    new_generation_seed,
+    submit_generation,
 )
+from core.jobs import ACTIVE_STATUSES, CANCELLED, DONE, FAILED, QUEUED, RUNNING
+
+
+# Сколько последних задач показывать в очереди
+JOB_QUEUE_VISIBLE = 5
+# Опрос прогресса задач (сек): после изменений — MIN, без изменений интервал растёт до MAX.
+# В Streamlit 1.28 нет st.fragment и таймеров на клиенте, поэтому фоновый прогресс
+# подхватывается только rerun всей страницы — опрашиваем редко и только пока это видно
+JOB_POLL_MIN_INTERVAL = 0.5
+JOB_POLL_MAX_INTERVAL = 5.0
+JOB_POLL_BACKOFF = 1.5
+
+# Ключи чекбоксов выбора вариантов: variant_sel_<job_id>_<номер>
+SELECTION_KEY_PREFIX = "variant_sel_"
+
+JOB_STATUS_LABELS = {
+    QUEUED: "⏳ В очереди",
+    RUNNING: "🎨 Генерируется",
+    DONE: "✅ Готово",
+    FAILED: "❌ Ошибка",
+    CANCELLED: "🚫 Отменено",
+}
 
 
 def render_content_page(account: str):
@@ -24,7 +53,18 @@ def render_content_page(account: str):
     if "generated_content" not in st.session_state:
         st.session_state.generated_content = None
     if "selected_variants" not in st.session_state:
-        st.session_state.selected_variants = []
+        st.session_state.selected_variants = set()
+    if "generation_jobs" not in st.session_state:
+        st.session_state.generation_jobs = []
+    if "generated_job_id" not in st.session_state:
+        st.session_state.generated_job_id = None
+    if "follow_jobs_after" not in st.session_state:
+        # Автопереключение только на задачи, поставленные позже этого момента
+        st.session_state.follow_jobs_after = 0.0
+
+    jobs = _session_jobs()
+    _sync_generated_content(jobs)
+    pending_slots = {}
 
     col_left, col_right = st.columns([1.5, 1.8])
 
@@ -81,7 +121,17 @@ def render_content_page(account: str):
             lora_id = ""
             lora_file = None
             if lora_mode == "ID LoRA":
-                lora_id = st.text_input(
+                registered = get_lora_registry().list()
+                choice = ""
+                if registered:
+                    entries = {e["id"]: e for e in registered}
+                    choice = st.selectbox(
+                        "LoRA из реестра",
+                        list(entries) + [""],
+                        format_func=lambda i: _format_lora(entries[i]) if i else "✏️ Ввести ID вручную",
+                        help="Загруженные ранее LoRA выбираются без повторной загрузки"
+                    )
+                lora_id = choice or st.text_input(
                     "LoRA ID",
                     placeholder="sexy_lora_v2",
                     help="Введите ID или имя LoRA модели"
@@ -93,7 +143,10 @@ def render_content_page(account: str):
                     help="Загрузите свой файл LoRA (.safetensors)"
                 )
                 if lora_file:
-                    st.success(f"✅ Загружен: {lora_file.name}")
+                    entry = _register_lora(lora_file)
+                    lora_id = entry["id"]
+                    st.success(f"✅ Загружен: {_format_lora(entry)}")
+                    st.caption(f"В следующий раз выберите его по ID `{entry['id']}` — без загрузки")
 
             # Тип контента
             st.markdown('<div class="section-divider"></div>', unsafe_allow_html=True)
@@ -118,6 +171,16 @@ def render_content_page(account: str):
                 help="Опишите желаемое изображение/видео"
             )
 
+            # Seed: те же параметры и seed берутся из кеша без повторной генерации
+            seed = st.number_input(
+                "🎲 Seed",
+                min_value=0,
+                max_value=2**31 - 1,
+                value=0,
+                step=1,
+                help="Одинаковые параметры и seed отдаются из кеша; перегенерация берёт новый seed"
+            )
+
             # Количество вариантов
             n_variants = st.slider(
                 "🔢 Количество вариантов",
@@ -137,7 +200,7 @@ def render_content_page(account: str):
                 max_value=8000,
                 value=2000,
                 step=500,
-                help="1k токенов ≈ 1 изображение"
+                help="На один вариант; 1k токенов ≈ 1 изображение"
             )
             price_per_1k = st.number_input(
                 "Цена за 1k токенов, $",
@@ -158,6 +221,8 @@ def render_content_page(account: str):
             step=0.5
         )
         sell_price = cost * markup
+        # С бюджета списывается цена модели из настроек сервера, а не оценка калькулятора
+        job_cost = get_variant_price(model_name) * n_variants
         
         st.markdown(f"""
             <div class="cost-card">
@@ -165,6 +230,10 @@ def render_content_page(account: str):
                     <span style="color: #aaa; font-size: 13px;">Себестоимость:</span>
                     <span style="color: #fff; font-weight: 600;">${cost:.4f}</span>
                 </div>
+                <div style="display: flex; justify-content: space-between; margin-bottom: 12px;">
+                    <span style="color: #aaa; font-size: 13px;">Списание с бюджета ({n_variants} вар.):</span>
+                    <span style="color: #fff; font-weight: 600;">${job_cost:.4f}</span>
+                </div>
                 <div style="display: flex; justify-content: space-between; margin-bottom: 12px;">
                     <span style="color: #aaa; font-size: 13px;">Наценка:</span>
                     <span style="color: #fff; font-weight: 600;">{markup}x</span>
@@ -181,6 +250,8 @@ def render_content_page(account: str):
             </div>
         """, unsafe_allow_html=True)
 
+        _render_budget(account, job_cost)
+
         # Кнопка генерации
         st.markdown("---")
         generate_disabled = not prompt.strip()
@@ -192,46 +263,24 @@ def render_content_page(account: str):
             disabled=generate_disabled,
             help="Введите промпт для генерации" if generate_disabled else "Запустить генерацию"
         ):
-            with st.spinner("🎨 Генерирую контент..."):
-                params = {
-                    "prompt": prompt,
-                    "model_name": model_name,
-                    "lora_id": lora_id,
-                    "content_type": content_type,
-                    "subcategory": subcategory,
-                    "n_variants": n_variants,
-                }
-                
-                if content_type == "Фото":
-                    urls = fake_generate_images(
-                        prompt=params["prompt"],
-                        model_name=params["model_name"],
-                        lora_id=params["lora_id"],
-                        n=params["n_variants"],
-                    )
-                    st.session_state.generated_content = {
-                        "type": "image",
-                        "urls": urls,
-                        "params": params
-                    }
-                else:
-                    urls = fake_generate_videos(
-                        prompt=params["prompt"],
-                        model_name=params["model_name"],
-                        lora_id=params["lora_id"],
-                        n=params["n_variants"],
-                    )
-                    st.session_state.generated_content = {
-                        "type": "video",
-                        "urls": urls,
-                        "params": params
-                    }
-                
-                st.session_state.selected_variants = []
+            params = {
+                "prompt": prompt,
+                "model_name": model_name,
+                "lora_id": lora_id,
+                "content_type": content_type,
+                "subcategory": subcategory,
+                "n_variants": n_variants,
+                "seed": int(seed),
+            }
+            # Генерация идёт в фоне — страница не блокируется, можно ставить ещё задачи
+            if _submit_job(account, params):
                 st.rerun()
 
     # ===== ПРАВАЯ ЧАСТЬ: РЕЗУЛЬТАТЫ И ВЫБОР =====
     with col_right:
+        if jobs:
+            _render_job_queue(jobs)
+
         st.markdown("### 🖼️ Результаты генерации")
         
         if st.session_state.generated_content:
@@ -251,7 +300,7 @@ def render_content_page(account: str):
                             {'📸 Фотографии' if content['type'] == 'image' else '🎬 Видео'}
                         </span>
                         <span style="color: #4CAF50; font-weight: 600;">
-                            {len(content['urls'])} вариантов
+                            {_format_variant_count(len(content['results']), content['n_variants'])}
                         </span>
                     </div>
                     <div style="font-size: 12px; color: #aaa; margin-top: 4px;">
@@ -260,38 +309,80 @@ def render_content_page(account: str):
                 </div>
             """, unsafe_allow_html=True)
             
-            # Отображение результатов
-            if content["type"] == "image":
-                _render_image_results(content["urls"])
-            else:
-                _render_video_results(content["urls"])
-            
-            # Действия с выбранным контентом
-            st.markdown("---")
-            selected_count = len(st.session_state.selected_variants)
-            
-            if selected_count > 0:
-                st.markdown(f"""
-                    <div style="
-                        background: linear-gradient(135deg, rgba(76, 175, 80, 0.15) 0%, rgba(67, 160, 71, 0.15) 100%);
-                        padding: 12px;
-                        border-radius: 8px;
-                        text-align: center;
-                        margin-bottom: 12px;
-                    ">
-                        <span style="font-size: 16px; font-weight: 600; color: #4CAF50;">
-                            ✅ Выбрано: {selected_count} {_get_variant_word(selected_count)}
-                        </span>
-                    </div>
-                """, unsafe_allow_html=True)
-                
+            # Выбор вариантов — внутри формы: клик по чекбоксу не перезапускает страницу,
+            # выбор применяется вместе с действием (выбрать все / инвертировать / сохранить / отправить)
+            job_id = st.session_state.generated_job_id
+            n_ready = len(content["results"])
+            with st.form(f"variants_form_{job_id}"):
+                # Готовые варианты + заглушки под ещё не готовые
+                if content["type"] == "image":
+                    pending_slots = _render_image_results(content["results"], content["n_variants"])
+                else:
+                    pending_slots = _render_video_results(content["results"], content["n_variants"])
+
+                selected_count = len(st.session_state.selected_variants)
+                if selected_count > 0:
+                    st.markdown(f"""
+                        <div style="
+                            background: linear-gradient(135deg, rgba(76, 175, 80, 0.15) 0%, rgba(67, 160, 71, 0.15) 100%);
+                            padding: 12px;
+                            border-radius: 8px;
+                            text-align: center;
+                            margin-bottom: 12px;
+                        ">
+                            <span style="font-size: 16px; font-weight: 600; color: #4CAF50;">
+                                ✅ Выбрано: {selected_count} {_get_variant_word(selected_count)}
+                            </span>
+                        </div>
+                    """, unsafe_allow_html=True)
+
+                col_all, col_invert, col_none = st.columns(3)
+                with col_all:
+                    st.form_submit_button(
+                        "☑️ Выбрать все",
+                        use_container_width=True,
+                        on_click=_set_selection, args=(job_id, n_ready, "all")
+                    )
+                with col_invert:
+                    st.form_submit_button(
+                        "🔄 Инвертировать",
+                        use_container_width=True,
+                        on_click=_set_selection, args=(job_id, n_ready, "invert")
+                    )
+                with col_none:
+                    st.form_submit_button(
+                        "✖ Снять выбор",
+                        use_container_width=True,
+                        on_click=_set_selection, args=(job_id, n_ready, "none")
+                    )
+
                 col_save, col_send = st.columns(2)
                 with col_save:
-                    if st.button("💾 Сохранить", use_container_width=True, type="secondary"):
-                        st.success(f"✅ Сохранено {selected_count} {_get_variant_word(selected_count)}")
+                    save = st.form_submit_button(
+                        "💾 Сохранить",
+                        use_container_width=True,
+                        type="secondary",
+                        on_click=_set_selection, args=(job_id, n_ready, "apply")
+                    )
                 with col_send:
-                    if st.button("📤 Отправить фану", use_container_width=True, type="primary"):
-                        st.success(f"✅ Отправлено {selected_count} {_get_variant_word(selected_count)}")
+                    send = st.form_submit_button(
+                        "📤 Отправить фану",
+                        use_container_width=True,
+                        type="primary",
+                        on_click=_set_selection, args=(job_id, n_ready, "apply")
+                    )
+
+            selected_count = len(st.session_state.selected_variants)
+            if save or send:
+                if selected_count == 0:
+                    st.warning("⚠️ Не выбрано ни одного варианта")
+                elif save:
+                    st.success(f"✅ Сохранено {selected_count} {_get_variant_word(selected_count)}")
+                else:
+                    st.success(f"✅ Отправлено {selected_count} {_get_variant_word(selected_count)}")
+
+            # Оригинал грузится только по запросу и только для одного варианта
+            _render_full_size(content)
             
             # Кнопка перегенерации
             st.markdown('<div style="margin-top: 16px;"></div>', unsafe_allow_html=True)
@@ -300,41 +391,15 @@ def render_content_page(account: str):
                 use_container_width=True,
                 type="secondary"
             ):
-                with st.spinner("🎨 Перегенерирую..."):
-                    params = content["params"]
-                    
-                    if params["content_type"] == "Фото":
-                        urls = fake_generate_images(
-                            prompt=params["prompt"],
-                            model_name=params["model_name"],
-                            lora_id=params["lora_id"],
-                            n=params["n_variants"],
-                        )
-                        st.session_state.generated_content = {
-                            "type": "image",
-                            "urls": urls,
-                            "params": params
-                        }
-                    else:
-                        urls = fake_generate_videos(
-                            prompt=params["prompt"],
-                            model_name=params["model_name"],
-                            lora_id=params["lora_id"],
-                            n=params["n_variants"],
-                        )
-                        st.session_state.generated_content = {
-                            "type": "video",
-                            "urls": urls,
-                            "params": params
-                        }
-                    
-                    st.session_state.selected_variants = []
+                # Новый seed — намеренный промах мимо кеша
+                if _submit_job(account, {**content["params"], "seed": new_generation_seed()}):
                     st.rerun()
             
             # Кнопка очистки
             if st.button("🗑️ Очистить результаты", use_container_width=True):
+                # generated_job_id не сбрасываем, чтобы старые задачи не всплыли снова
                 st.session_state.generated_content = None
-                st.session_state.selected_variants = []
+                _reset_selection()
                 st.rerun()
         else:
             # Пустое состояние
@@ -358,8 +423,266 @@ def render_content_page(account: str):
             """, unsafe_allow_html=True)
 
 
-def _render_image_results(urls: list) -> None:
-    """Отрисовка результатов генерации изображений"""
+    # Варианты, готовые к концу прогона, сразу дорисовываются в заглушки
+    shown_job = get_job_queue().get(st.session_state.generated_job_id or "")
+    if pending_slots and shown_job is not None and st.session_state.generated_content:
+        _fill_ready_variants(shown_job, pending_slots)
+
+    _poll_jobs(jobs, shown_job)
+
+
+def _register_lora(lora_file) -> dict:
+    """Записать загруженный файл в реестр LoRA (один раз на загрузку, не на каждый rerun)"""
+    uploads = st.session_state.setdefault("lora_uploads", {})
+    upload_id = getattr(lora_file, "file_id", None) or f"{lora_file.name}:{lora_file.size}"
+    lora_id = uploads.get(upload_id)
+    entry = get_lora_registry().get(lora_id) if lora_id else None
+    if entry is None:
+        lora_file.seek(0)
+        with st.spinner("Сохраняю LoRA..."):
+            entry = get_lora_registry().ingest(lora_file, lora_file.name)
+        uploads[upload_id] = entry["id"]
+    return entry
+
+
+def _format_lora(entry: dict) -> str:
+    base = f" · {entry['base_model']}" if entry["base_model"] else ""
+    return f"{entry['name']}{base} · {entry['size'] / 1024 / 1024:.1f} MB"
+
+
+def _submit_job(account: str, params: dict) -> bool:
+    """Поставить генерацию в очередь и запомнить задачу в сессии; False — упёрлись в бюджет"""
+    kind = "image" if params["content_type"] == "Фото" else "video"
+    try:
+        job = submit_generation(account, kind, params)
+    except BudgetExceededError as e:
+        st.error(f"💸 {e}")
+        return False
+    st.session_state.generation_jobs.append(job.id)
+    return True
+
+
+def _render_budget(account: str, job_cost: float) -> None:
+    """Траты аккаунта за месяц (из дневных агрегатов журнала) против бюджета"""
+    spent = get_cost_ledger().month_spend(account)
+    budget = get_generation_budget(account)
+    if budget <= 0:
+        st.caption(f"💳 Потрачено на генерацию в этом месяце: ${spent:.2f}")
+        return
+    st.progress(min(spent / budget, 1.0), text=f"💳 Бюджет на месяц: ${spent:.2f} из ${budget:.2f}")
+    if spent + job_cost > budget:
+        st.warning(f"⚠️ Задача (~${job_cost:.2f}) не помещается в остаток бюджета")
+
+
+def _session_jobs() -> list:
+    """Задачи текущей сессии (ещё живые в очереди), в порядке постановки"""
+    queue = get_job_queue()
+    jobs = [queue.get(job_id) for job_id in st.session_state.generation_jobs]
+    jobs = [job for job in jobs if job is not None]
+    st.session_state.generation_jobs = [job.id for job in jobs]
+    return jobs
+
+
+def _show_job(job, pinned: bool = False) -> None:
+    """
+    Показать результаты задачи в блоке результатов.
+    pinned — выбор пользователя (👁): на задачи, поставленные раньше этого момента,
+    страница больше сама не переключается
+    """
+    follow_after = time.time() if pinned else job.created_at
+    st.session_state.follow_jobs_after = max(st.session_state.follow_jobs_after, follow_after)
+    st.session_state.generated_content = {
+        "type": job.kind,
+        "results": list(job.results),
+        "params": job.params,
+        "n_variants": _expected_variants(job),
+    }
+    st.session_state.generated_job_id = job.id
+    _reset_selection()
+
+
+def _sync_generated_content(jobs: list) -> None:
+    """
+    Подтянуть готовые варианты показанной задачи и переключиться на новую,
+    как только она начала выполняться (результаты стримятся по одному).
+    Следуем только за задачами, поставленными после последнего переключения
+    или выбора пользователя, — иначе выбор через 👁 сразу перебивался бы
+    """
+    follow_after = st.session_state.follow_jobs_after
+    for job in reversed(jobs):
+        if job.created_at > follow_after and job.status in (RUNNING, DONE):
+            _show_job(job)
+            return
+
+    content = st.session_state.generated_content
+    shown = next((job for job in jobs if job.id == st.session_state.generated_job_id), None)
+    if content and shown is not None:
+        content["results"] = list(shown.results)
+        content["n_variants"] = _expected_variants(shown)
+
+
+def _expected_variants(job) -> int:
+    """Сколько вариантов ещё имеет смысл ждать: у упавшей/отменённой задачи — только готовые"""
+    return job.n_variants if job.status in ACTIVE_STATUSES else len(job.results)
+
+
+def _fill_ready_variants(job, slots: dict) -> None:
+    """
+    Заполнить заглушки вариантами, готовыми на данный момент, не дожидаясь остальных;
+    чекбоксы для них появятся на следующем прогоне
+    """
+    kind = st.session_state.generated_content["type"]
+    results = list(job.results)
+    for i in [i for i in slots if i < len(results)]:
+        _fill_variant(slots.pop(i), kind, i, results[i])
+
+
+def _poll_jobs(jobs: list, shown_job) -> None:
+    """
+    Один ограниченный по времени опрос в конце прогона: нужен, только пока активна
+    показанная задача или задача из видимой части очереди. Пока прогресса нет,
+    интервал растёт (JOB_POLL_BACKOFF) — страница не перерисовывается каждую секунду.
+    Состояние сессии меняется до ожидания: устаревший прогон (fastReruns) после
+    сна только упрётся в st.rerun и не перезапишет результаты более нового.
+    """
+    watched = list(jobs[-JOB_QUEUE_VISIBLE:])
+    if shown_job is not None and shown_job not in watched:
+        watched.append(shown_job)
+    active = [job for job in watched if job.status in ACTIVE_STATUSES]
+    if not active:
+        st.session_state.pop("job_poll", None)
+        return
+
+    progress = tuple((job.id, job.status, len(job.results)) for job in active)
+    last = st.session_state.get("job_poll")
+    if last is None or last["progress"] != progress:
+        delay = JOB_POLL_MIN_INTERVAL
+    else:
+        delay = min(last["delay"] * JOB_POLL_BACKOFF, JOB_POLL_MAX_INTERVAL)
+    st.session_state.job_poll = {"progress": progress, "delay": delay}
+
+    time.sleep(delay)
+    st.rerun()
+
+
+def _fill_variant(slot, kind: str, i: int, item: dict) -> None:
+    """Показать превью готового варианта на месте заглушки"""
+    with slot.container():
+        if kind == "image":
+            st.image(_preview_src(item), use_column_width=True)
+        else:
+            _render_video_preview(i, item, False)
+
+
+def _preview_src(item: dict) -> str:
+    """Что показывать в сетке: миниатюру, если она есть, иначе оригинал"""
+    return item["thumb"] or item["url"]
+
+
+def _render_full_size(content: dict) -> None:
+    """Просмотр оригинала одного варианта (полноразмерный файл грузится только здесь)"""
+    results = content["results"]
+    if not any(item["thumb"] or item["preview"] for item in results):
+        return
+    i = st.selectbox(
+        "🔍 Открыть оригинал",
+        [None] + list(range(len(results))),
+        format_func=lambda i: "—" if i is None else f"Вариант {i + 1}",
+        key=f"full_variant_{st.session_state.generated_job_id}"
+    )
+    if i is None:
+        return
+    if content["type"] == "image":
+        st.image(results[i]["url"], use_column_width=True)
+    else:
+        st.video(results[i]["url"])
+
+
+def _selection_key(job_id: str, i: int) -> str:
+    return f"{SELECTION_KEY_PREFIX}{job_id}_{i}"
+
+
+def _reset_selection() -> None:
+    """Сбросить выбор вместе с состоянием чекбоксов, иначе они останутся отмеченными"""
+    for key in [k for k in st.session_state if str(k).startswith(SELECTION_KEY_PREFIX)]:
+        del st.session_state[key]
+    st.session_state.selected_variants = set()
+
+
+def _set_selection(job_id: str, n: int, action: str) -> None:
+    """
+    Колбэк кнопок формы (выполняется до перерисовки): применить отмеченные чекбоксы
+    или пакетно выставить выбор — all / invert / none
+    """
+    keys = [_selection_key(job_id, i) for i in range(n)]
+    if action == "all":
+        selected = set(range(n))
+    elif action == "none":
+        selected = set()
+    else:
+        selected = {i for i, key in enumerate(keys) if st.session_state.get(key)}
+        if action == "invert":
+            selected = set(range(n)) - selected
+    for i, key in enumerate(keys):
+        st.session_state[key] = i in selected
+    st.session_state.selected_variants = selected
+
+
+def _render_pending_variant(i: int):
+    """Заглушка под ещё не готовый вариант; возвращает слот для подмены результатом"""
+    slot = st.empty()
+    slot.markdown(f"""
+        <div style="
+            background: rgba(255, 255, 255, 0.03);
+            border: 2px dashed rgba(255, 255, 255, 0.1);
+            border-radius: 12px;
+            padding: 40px 16px;
+            margin-bottom: 16px;
+            text-align: center;
+            color: #888;
+        ">
+            ⏳ Вариант {i + 1} генерируется...
+        </div>
+    """, unsafe_allow_html=True)
+    return slot
+
+
+def _format_variant_count(done: int, total: int) -> str:
+    if done < total:
+        return f"{done}/{total} вариантов"
+    return f"{total} {_get_variant_word(total)}"
+
+
+def _render_job_queue(jobs: list) -> None:
+    """Очередь генерации текущей сессии: прогресс, отмена, просмотр результатов"""
+    st.markdown("### 📋 Очередь генерации")
+    for job in reversed(jobs[-JOB_QUEUE_VISIBLE:]):
+        params = job.params
+        done = len(job.results)
+        label = (
+            f"{JOB_STATUS_LABELS.get(job.status, job.status)} · {params['model_name']} · "
+            f"{params['content_type']} · {done}/{job.n_variants}"
+        )
+        col_progress, col_action = st.columns([4, 1])
+        with col_progress:
+            st.progress(job.progress, text=label)
+            if job.status == FAILED and job.error:
+                st.caption(f"❌ {job.error}")
+        with col_action:
+            if job.status in ACTIVE_STATUSES:
+                if st.button("✖", key=f"job_cancel_{job.id}", help="Отменить задачу"):
+                    get_job_queue().cancel(job.id)
+                    st.rerun()
+            elif job.results and (
+                job.id != st.session_state.generated_job_id or not st.session_state.generated_content
+            ):
+                if st.button("👁", key=f"job_show_{job.id}", help="Показать результаты"):
+                    _show_job(job, pinned=True)
+                    st.rerun()
+
+
+def _render_image_results(results: list, n_variants: int) -> dict:
+    """Отрисовка результатов генерации изображений; возвращает {номер: слот} для не готовых"""
     st.markdown("""
         <style>
         .image-card {
@@ -382,7 +705,7 @@ def _render_image_results(urls: list) -> None:
         </style>
     """, unsafe_allow_html=True)
     
-    for i, url in enumerate(urls):
+    for i, item in enumerate(results):
         is_selected = i in st.session_state.selected_variants
         
         card_class = "image-card-selected" if is_selected else ""
@@ -391,60 +714,62 @@ def _render_image_results(urls: list) -> None:
         
         with col_img:
             st.markdown(f'<div class="image-card {card_class}">', unsafe_allow_html=True)
-            st.image(url, use_container_width=True)
+            st.image(_preview_src(item), use_column_width=True)
             st.markdown('</div>', unsafe_allow_html=True)
         
         with col_check:
             st.markdown('<div style="padding-top: 40%;"></div>', unsafe_allow_html=True)
-            if st.checkbox(
-                "✓",
-                value=is_selected,
-                key=f"img_sel_{i}",
-                label_visibility="collapsed"
-            ):
-                if i not in st.session_state.selected_variants:
-                    st.session_state.selected_variants.append(i)
-                    st.rerun()
-            else:
-                if i in st.session_state.selected_variants:
-                    st.session_state.selected_variants.remove(i)
-                    st.rerun()
+            _render_selection_checkbox(i, "✓", label_visibility="collapsed")
 
+    return {i: _render_pending_variant(i) for i in range(len(results), n_variants)}
 
-def _render_video_results(urls: list) -> None:
-    """Отрисовка результатов генерации видео"""
-    for i, url in enumerate(urls):
-        is_selected = i in st.session_state.selected_variants
-        
-        st.markdown(f"""
-            <div style="
-                background: rgba(255, 255, 255, 0.05);
-                padding: 16px;
-                border-radius: 10px;
-                margin-bottom: 12px;
-                border-left: 4px solid {'#4CAF50' if is_selected else '#667eea'};
-            ">
-                <div style="display: flex; justify-content: space-between; align-items: center;">
-                    <div>
-                        <div style="font-weight: 600; margin-bottom: 4px;">🎬 Вариант {i + 1}</div>
-                        <div style="font-size: 12px; color: #888; font-family: monospace;">{url}</div>
-                    </div>
+
+def _render_selection_checkbox(i: int, label: str, **kwargs) -> None:
+    """Чекбокс варианта: внутри формы, значение попадает в выбор только при отправке формы"""
+    key = _selection_key(st.session_state.generated_job_id, i)
+    if key not in st.session_state:
+        st.session_state[key] = i in st.session_state.selected_variants
+    st.checkbox(label, key=key, **kwargs)
+
+
+def _video_card_html(i: int, is_selected: bool) -> str:
+    return f"""
+        <div style="
+            background: rgba(255, 255, 255, 0.05);
+            padding: 16px;
+            border-radius: 10px;
+            margin-bottom: 12px;
+            border-left: 4px solid {'#4CAF50' if is_selected else '#667eea'};
+        ">
+            <div style="display: flex; justify-content: space-between; align-items: center;">
+                <div>
+                    <div style="font-weight: 600; margin-bottom: 4px;">🎬 Вариант {i + 1}</div>
                 </div>
             </div>
-        """, unsafe_allow_html=True)
+        </div>
+    """
+
+
+def _render_video_preview(i: int, item: dict, is_selected: bool) -> None:
+    """Карточка видео: превью-ролик или кадр-обложка; без превью — ссылка на оригинал"""
+    st.markdown(_video_card_html(i, is_selected), unsafe_allow_html=True)
+    if item["preview"]:
+        st.video(item["preview"])
+    elif item["thumb"]:
+        st.image(item["thumb"], use_column_width=True)
+    else:
+        st.caption(item["url"])
+
+
+def _render_video_results(results: list, n_variants: int) -> dict:
+    """Отрисовка результатов генерации видео; возвращает {номер: слот} для не готовых"""
+    for i, item in enumerate(results):
+        is_selected = i in st.session_state.selected_variants
         
-        if st.checkbox(
-            f"✓ Выбрать вариант {i + 1}",
-            value=is_selected,
-            key=f"vid_sel_{i}"
-        ):
-            if i not in st.session_state.selected_variants:
-                st.session_state.selected_variants.append(i)
-                st.rerun()
-        else:
-            if i in st.session_state.selected_variants:
-                st.session_state.selected_variants.remove(i)
-                st.rerun()
+        _render_video_preview(i, item, is_selected)
+        _render_selection_checkbox(i, f"✓ Выбрать вариант {i + 1}")
+
+    return {i: _render_pending_variant(i) for i in range(len(results), n_variants)}
 
 
 def _get_variant_word(count: int) -> str:
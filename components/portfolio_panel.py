@@ -0,0 +1,179 @@
+# components/portfolio_panel.py
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from datetime import date, timedelta
+from typing import List
+from core.data import get_portfolio_kpis, get_portfolio_series
+from core.chart_cache import cached_figure
+from core.downsample import downsample
+from core.utils import get_settings
+
+
+def render_portfolio_page(accounts: List[str]):
+    st.header("🗂 Портфель аккаунтов")
+
+    if not accounts:
+        st.warning("⚠️ У вас нет доступных аккаунтов")
+        return
+
+    today = date.today()
+    date_range = st.date_input(
+        "📅 Период",
+        value=(today - timedelta(days=6), today),
+        max_value=today,
+        key="portfolio_range"
+    )
+    if isinstance(date_range, (tuple, list)):
+        start_date = date_range[0] if date_range else today
+        end_date = date_range[1] if len(date_range) > 1 else start_date
+    else:
+        start_date = end_date = date_range
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+
+    # Все аккаунты догружаются одним параллельным батчем, KPI — из дневных агрегатов
+    try:
+        kpis, kpi_errors = get_portfolio_kpis(accounts, start, end)
+        revenue, series_errors = get_portfolio_series(accounts, "revenue", start, end)
+    except Exception as e:
+        st.error(f"❌ Ошибка загрузки данных: {str(e)}")
+        return
+
+    # Аккаунты, которые не догрузились, не показываем нулями — это читалось бы как «нет дохода»
+    failed = {**series_errors, **kpi_errors}
+    if failed:
+        st.warning(
+            "⚠️ Не удалось загрузить данные аккаунтов, они не учтены в сводке: "
+            + "; ".join(f"{account} ({error})" for account, error in failed.items())
+        )
+        kpis = kpis[~kpis["account"].isin(failed)]
+        revenue = revenue.drop(columns=[a for a in failed if a in revenue.columns])
+    if kpis.empty:
+        return
+
+    # Сводные метрики
+    total_rev = kpis["revenue"].sum()
+    prev_rev = kpis["prev_revenue"].sum()
+    total_subs = kpis["subs"].sum()
+    watch_count = kpis["watch_count"].sum()
+    avg_watch = kpis["watch_sum"].sum() / watch_count if watch_count else 0.0
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("💰 Доход", f"${total_rev:,.0f}", f"{total_rev - prev_rev:+,.0f}$")
+    with col2:
+        st.metric("👥 Новые подписчики", f"{total_subs:,.0f}")
+    with col3:
+        st.metric("⏱️ Avg watch", f"{avg_watch:.1f} мин")
+    with col4:
+        st.metric("🎭 Аккаунтов", len(kpis), f"-{len(failed)} недоступно" if failed else None)
+
+    st.markdown("---")
+
+    # Сравнение аккаунтов
+    col_left, col_right = st.columns(2)
+    with col_left:
+        st.plotly_chart(_create_accounts_revenue_chart(kpis), use_container_width=True)
+    with col_right:
+        st.plotly_chart(
+            _create_revenue_share_chart(revenue, get_settings().chart_max_points),
+            use_container_width=True
+        )
+
+    # Таблица по аккаунтам
+    st.markdown("### 📋 По аккаунтам")
+    table = kpis.assign(
+        growth=(kpis["revenue"] - kpis["prev_revenue"])
+        / kpis["prev_revenue"].where(kpis["prev_revenue"] > 0) * 100,
+        share=kpis["revenue"] / total_rev * 100 if total_rev else 0.0,
+    )
+    table = table.sort_values("revenue", ascending=False)[
+        ["account", "revenue", "growth", "share", "subs", "tips", "avg_watch"]
+    ].rename(columns={
+        "account": "Аккаунт",
+        "revenue": "Доход ($)",
+        "growth": "Рост, %",
+        "share": "Доля, %",
+        "subs": "Подписчики",
+        "tips": "Донаты",
+        "avg_watch": "Avg watch (мин)",
+    })
+    st.dataframe(
+        table.style.format({
+            "Доход ($)": "{:,.0f}",
+            "Рост, %": "{:+.1f}",
+            "Доля, %": "{:.1f}",
+            "Подписчики": "{:,.0f}",
+            "Донаты": "{:,.0f}",
+            "Avg watch (мин)": "{:.1f}",
+        }, na_rep="—"),
+        use_container_width=True,
+        hide_index=True
+    )
+
+
+@cached_figure
+def _create_accounts_revenue_chart(kpis: pd.DataFrame):
+    """Доход аккаунтов за период и за предыдущий такой же период"""
+    data = kpis.sort_values("revenue", ascending=True)
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        y=data["account"],
+        x=data["prev_revenue"],
+        name="Прошлый период",
+        orientation="h",
+        marker=dict(color="rgba(102, 126, 234, 0.35)")
+    ))
+    fig.add_trace(go.Bar(
+        y=data["account"],
+        x=data["revenue"],
+        name="Текущий период",
+        orientation="h",
+        marker=dict(color="#4CAF50")
+    ))
+
+    fig.update_layout(
+        title="Доход по аккаунтам",
+        barmode="group",
+        xaxis=dict(title="Доход ($)", showgrid=True, gridcolor='rgba(255,255,255,0.1)'),
+        yaxis=dict(showgrid=False),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white'),
+        height=max(300, 40 * len(data) + 120),
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+
+    return fig
+
+
+@cached_figure
+def _create_revenue_share_chart(revenue: pd.DataFrame, max_points: int = 500):
+    """Дневной доход по аккаунтам (накопительные области, прорежено до max_points)"""
+    frame = revenue.rename_axis("day").reset_index()
+    # Прореживаем по суммарному доходу, чтобы все слои брали одни и те же дни
+    frame["_total"] = revenue.sum(axis=1).to_numpy()
+    frame = downsample(frame, "day", "_total", max_points).drop(columns="_total")
+    long = frame.melt(id_vars="day", var_name="account", value_name="revenue")
+
+    fig = px.area(
+        long,
+        x="day",
+        y="revenue",
+        color="account",
+        title="Дневной доход портфеля",
+    )
+
+    fig.update_layout(
+        xaxis=dict(title="День", showgrid=False),
+        yaxis=dict(title="Доход ($)", showgrid=True, gridcolor='rgba(255,255,255,0.1)'),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='white'),
+        hovermode='x unified',
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+
+    return fig
@@ -0,0 +1,133 @@
+# core/achievements.py
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from core.cache import TTLCache
+from core.rollups import DailyRollup
+
+
+Achievement = Dict[str, str]
+
+# Сколько дней истории до недели смотрим для правил-рекордов
+RECORD_LOOKBACK_DAYS = 90
+
+
+@dataclass(frozen=True)
+class StreakRule:
+    """N дней подряд, когда дневное значение поля не ниже threshold."""
+    field: str
+    threshold: float
+    min_days: int
+    text: str  # шаблон, {days} — длина серии
+    icon: str = "✅"
+    color: str = "#4CAF50"
+
+    def evaluate(self, week: Dict[str, np.ndarray], history: Dict[str, np.ndarray]) -> Achievement | None:
+        hits = (week[self.field] >= self.threshold).astype(np.int8)
+        edges = np.diff(np.concatenate([[0], hits, [0]]))
+        runs = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+        longest = int(runs.max()) if len(runs) else 0
+        if longest < self.min_days:
+            return None
+        return {"icon": self.icon, "text": self.text.format(days=longest), "color": self.color}
+
+
+@dataclass(frozen=True)
+class ThresholdRule:
+    """Сколько дней недели дневное значение поля было не ниже threshold."""
+    field: str
+    threshold: float
+    min_days: int
+    text: str  # шаблон, {days} — дней с выполнением, {total} — дней в неделе
+    icon: str = "✅"
+    color: str = "#4CAF50"
+
+    def evaluate(self, week: Dict[str, np.ndarray], history: Dict[str, np.ndarray]) -> Achievement | None:
+        if self.threshold <= 0:
+            return None
+        days = int(np.count_nonzero(week[self.field] >= self.threshold))
+        if days < self.min_days:
+            return None
+        return {
+            "icon": self.icon,
+            "text": self.text.format(days=days, total=len(week[self.field])),
+            "color": self.color,
+        }
+
+
+@dataclass(frozen=True)
+class RecordRule:
+    """Дневной рекорд поля на неделе относительно всей предыдущей истории."""
+    field: str
+    text: str  # шаблон, {value} — рекордное значение
+    icon: str = "🎯"
+    color: str = "#FFD700"
+
+    def evaluate(self, week: Dict[str, np.ndarray], history: Dict[str, np.ndarray]) -> Achievement | None:
+        values = week[self.field]
+        past = history[self.field]
+        if not len(values) or not len(past) or not past.any():
+            return None
+        best = float(values.max())
+        if best <= float(past.max()):
+            return None
+        return {"icon": self.icon, "text": self.text.format(value=best), "color": self.color}
+
+
+def default_rules(daily_revenue_goal: float) -> Tuple:
+    """Стандартный набор достижений недели."""
+    return (
+        ThresholdRule("revenue", daily_revenue_goal, 1, "Закрыт план по доходу {days}/{total} дней"),
+        StreakRule("avg_watch", 20.0, 2, "{days} дн. подряд с avg watch ≥ 20 мин"),
+        RecordRule("subs", "Новый рекорд по подписчикам за день: +{value:,.0f}"),
+        RecordRule("revenue", "Новый рекорд по доходу за день: ${value:,.0f}"),
+    )
+
+
+def _daily_series(rollup: DailyRollup, start_day: int, end_day: int) -> Dict[str, np.ndarray]:
+    watch_sum = rollup.series("watch_sum", start_day, end_day)
+    watch_count = rollup.series("watch_count", start_day, end_day)
+    return {
+        "revenue": rollup.series("revenue", start_day, end_day),
+        "subs": rollup.series("subs", start_day, end_day),
+        "tips": rollup.series("tips", start_day, end_day),
+        "avg_watch": np.divide(
+            watch_sum, watch_count, out=np.zeros_like(watch_sum), where=watch_count > 0
+        ),
+    }
+
+
+class AchievementEngine:
+    """
+    Вычисление достижений недели по дневным агрегатам.
+    Ряды за неделю и историю берутся одним проходом, правила — векторные операции
+    над ними; результат мемоизируется по (account, неделя, правила, версия агрегатов).
+    """
+
+    def __init__(self, cache_ttl: float = 3600.0, cache_size: int = 1024):
+        self._cache = TTLCache(ttl=cache_ttl, maxsize=cache_size)
+
+    def evaluate(
+        self,
+        account: str,
+        rollup: DailyRollup,
+        week_start_day: int,
+        days: int,
+        rules: Tuple,
+    ) -> List[Achievement]:
+        """
+        Достижения за дни [week_start_day, week_start_day + days).
+        """
+        key = (account, week_start_day, days, rules, rollup.version)
+
+        def compute() -> List[Achievement]:
+            week_end = week_start_day + days
+            series = _daily_series(rollup, week_start_day - RECORD_LOOKBACK_DAYS, week_end)
+            week = {f: v[-days:] for f, v in series.items()}
+            history = {f: v[:-days] for f, v in series.items()}
+            results = (rule.evaluate(week, history) for rule in rules)
+            return [a for a in results if a is not None]
+
+        return self._cache.get_or_load(key, compute)
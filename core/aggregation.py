@@ -0,0 +1,188 @@
+# core/aggregation.py
+import threading
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from core.cache import TTLCache
+
+
+GRANULARITIES = ("hour", "day", "week", "month")
+
+_HOUR_NS = 3_600 * 10**9
+_DAY_NS = 24 * _HOUR_NS
+# 1970-01-01 — четверг; сдвиг на 3 дня делает недели начинающимися с понедельника
+_WEEK_SHIFT_DAYS = 3
+
+
+class EventLog:
+    """
+    Колоночный журнал сырых событий аккаунта (numpy-массивы, отсортированы по времени).
+    Дописывается инкрементально: append принимает только события с id больше last_id.
+    Курсор хранится отдельно (max_id): после досортировки поздних событий
+    последний элемент ids уже не обязательно максимальный.
+    version растёт при каждом изменении — по нему инвалидируются кеши агрегатов.
+    """
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.ts = np.empty(0, dtype=np.int64)  # наносекунды
+        self.fan_id = np.empty(0, dtype=np.int64)
+        self.revenue = np.empty(0, dtype=np.float64)
+        self.subs = np.empty(0, dtype=np.int32)
+        self.watch_minutes = np.empty(0, dtype=np.float32)
+        self.max_id: int | None = None
+        self.version = 0
+        self.lock = threading.Lock()
+
+    @property
+    def last_id(self) -> int | None:
+        return self.max_id
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, events: pd.DataFrame) -> pd.DataFrame:
+        """
+        Дописать события (колонки как у OnlyFansClient.fetch_events).
+        Возвращает реально добавленные (id больше last_id) — их же получают инкрементальные роллапы.
+        """
+        with self.lock:
+            if self.max_id is not None:
+                events = events[events["id"].to_numpy() > self.max_id]
+            if events.empty:
+                return events
+            events = events.sort_values("id", kind="stable")
+            new_ts = events["ts"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+
+            new_ids = events["id"].to_numpy(dtype=np.int64)
+            self.max_id = int(new_ids.max()) if self.max_id is None else max(self.max_id, int(new_ids.max()))
+            self.ids = np.concatenate([self.ids, new_ids])
+            self.ts = np.concatenate([self.ts, new_ts])
+            self.fan_id = np.concatenate([self.fan_id, events["fan_id"].to_numpy(dtype=np.int64)])
+            self.revenue = np.concatenate([self.revenue, events["revenue"].to_numpy(dtype=np.float64)])
+            self.subs = np.concatenate([self.subs, events["subs"].to_numpy(dtype=np.int32)])
+            self.watch_minutes = np.concatenate(
+                [self.watch_minutes, events["watch_minutes"].to_numpy(dtype=np.float32)]
+            )
+
+            # Поздно пришедшие события нарушают порядок по времени — пересортировываем
+            if len(self.ts) > len(new_ts) and new_ts.min() < self.ts[-len(new_ts) - 1]:
+                order = np.argsort(self.ts, kind="stable")
+                for name in ("ids", "ts", "fan_id", "revenue", "subs", "watch_minutes"):
+                    setattr(self, name, getattr(self, name)[order])
+
+            self.version += 1
+            return events
+
+    def window(self, start_ns: int, end_ns: int) -> slice:
+        """Срез событий с start_ns <= ts < end_ns (бинарный поиск, без прохода по массиву)."""
+        lo = int(np.searchsorted(self.ts, start_ns, side="left"))
+        hi = int(np.searchsorted(self.ts, end_ns, side="left"))
+        return slice(lo, hi)
+
+
+def bucket_ordinals(ts_ns: np.ndarray, granularity: str) -> np.ndarray:
+    """Номер бакета для каждой метки времени (часы/дни/недели/месяцы от эпохи)."""
+    if granularity == "hour":
+        return ts_ns // _HOUR_NS
+    days = ts_ns // _DAY_NS
+    if granularity == "day":
+        return days
+    if granularity == "week":
+        return (days + _WEEK_SHIFT_DAYS) // 7
+    if granularity == "month":
+        return ts_ns.astype("datetime64[ns]").astype("datetime64[M]").astype(np.int64)
+    raise ValueError(f"Неизвестная гранулярность: {granularity}")
+
+
+def bucket_starts(ordinals: np.ndarray, granularity: str) -> np.ndarray:
+    """Начало бакета (datetime64[ns]) по его номеру."""
+    if granularity == "hour":
+        ns = ordinals * _HOUR_NS
+    elif granularity == "day":
+        ns = ordinals * _DAY_NS
+    elif granularity == "week":
+        ns = (ordinals * 7 - _WEEK_SHIFT_DAYS) * _DAY_NS
+    elif granularity == "month":
+        return ordinals.astype("datetime64[M]").astype("datetime64[ns]")
+    else:
+        raise ValueError(f"Неизвестная гранулярность: {granularity}")
+    return ns.astype("datetime64[ns]")
+
+
+def rollup(log: EventLog, start: pd.Timestamp, end: pd.Timestamp, granularity: str = "day") -> pd.DataFrame:
+    """
+    Агрегаты по бакетам для событий в [start, end).
+    Колонки: day (начало бакета), revenue, subs, avg_watch, tips, watch_sessions.
+    Пустые бакеты внутри диапазона присутствуют с нулями.
+    """
+    start_ns, end_ns = pd.Timestamp(start).value, pd.Timestamp(end).value
+    with log.lock:
+        window = log.window(start_ns, end_ns)
+        ts = log.ts[window]
+        revenue = log.revenue[window]
+        subs = log.subs[window]
+        watch = log.watch_minutes[window]
+
+    first, last = bucket_ordinals(np.array([start_ns, end_ns - 1], dtype=np.int64), granularity)
+    n_buckets = int(last - first + 1) if end_ns > start_ns else 0
+    idx = bucket_ordinals(ts, granularity) - first
+
+    is_tip = revenue > 0
+    is_watch = watch > 0
+
+    revenue_sum = np.bincount(idx, weights=revenue, minlength=n_buckets)
+    subs_sum = np.bincount(idx, weights=subs, minlength=n_buckets)
+    tips = np.bincount(idx, weights=is_tip, minlength=n_buckets)
+    watch_sum = np.bincount(idx, weights=watch, minlength=n_buckets)
+    watch_count = np.bincount(idx, weights=is_watch, minlength=n_buckets)
+    avg_watch = np.divide(watch_sum, watch_count, out=np.zeros(n_buckets), where=watch_count > 0)
+
+    return pd.DataFrame({
+        "day": bucket_starts(np.arange(first, first + n_buckets, dtype=np.int64), granularity),
+        "revenue": np.round(revenue_sum, 2),
+        "subs": subs_sum.astype(np.int64),
+        "avg_watch": np.round(avg_watch, 1),
+        "tips": tips.astype(np.int64),
+        "watch_sessions": watch_count.astype(np.int64),
+    })
+
+
+class AggregationEngine:
+    """
+    Журналы событий по аккаунтам + кеш готовых агрегатов
+    по (account, start, end, granularity). Новые события меняют версию журнала,
+    и старые агрегаты просто перестают совпадать по ключу.
+    """
+
+    def __init__(self, cache_ttl: float = 300.0, cache_size: int = 512):
+        self._logs: Dict[str, EventLog] = {}
+        self._lock = threading.Lock()
+        self._cache = TTLCache(ttl=cache_ttl, maxsize=cache_size)
+
+    def log(self, account: str) -> EventLog:
+        with self._lock:
+            log = self._logs.get(account)
+            if log is None:
+                log = EventLog()
+                self._logs[account] = log
+            return log
+
+    def ingest(self, account: str, events: pd.DataFrame) -> pd.DataFrame:
+        """Дописать события аккаунта; возвращает реально новые."""
+        return self.log(account).append(events)
+
+    def rollup(
+        self,
+        account: str,
+        start: pd.Timestamp,
+        end: pd.Timestamp,
+        granularity: str = "day",
+    ) -> pd.DataFrame:
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Неизвестная гранулярность: {granularity}")
+        log = self.log(account)
+        key = (account, pd.Timestamp(start), pd.Timestamp(end), granularity, log.version)
+        return self._cache.get_or_load(key, lambda: rollup(log, start, end, granularity))
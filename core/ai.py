@@ -16,9 +16,30 @@ def estimate_generation_cost(tokens: int, price_per_1k: float = 0.002) -> float:
     return tokens / 1000 * price_per_1k
 
 
-def fake_generate_images(prompt: str, model_name: str, lora_id: str, n: int = 4):
-    return [f"https://via.placeholder.com/400x600/FF69B4/FFFFFF?text={i+1}" for i in range(n)]
-
-
-def fake_generate_videos(prompt: str, model_name: str, lora_id: str, n: int = 2):
-    return [f"https://example.com/fake_video_{i+1}.mp4" for i in range(n)]
+def fake_generate_images(
+    prompt: str, model_name: str, lora_id: str, n: int = 4, offset: int = 0, seed: int | None = None
+):
+    return [f"https://via.placeholder.com/400x600/FF69B4/FFFFFF?text={offset+i+1}" for i in range(n)]
+
+
+def fake_generate_videos(
+    prompt: str, model_name: str, lora_id: str, n: int = 2, offset: int = 0, seed: int | None = None
+):
+    return [f"https://example.com/fake_video_{offset+i+1}.mp4" for i in range(n)]
+
+
+def generate_variant(kind: str, params: Dict[str, Any], index: int) -> str:
+    """
+    Один вариант генерации (kind: "image" | "video") — единица работы очереди задач.
+    Seed варианта — params["seed"] + index: одинаковые параметры дают одинаковый результат.
+    """
+    generate = fake_generate_images if kind == "image" else fake_generate_videos
+    seed = params.get("seed")
+    return generate(
+        prompt=params["prompt"],
+        model_name=params["model_name"],
+        lora_id=params["lora_id"],
+        n=1,
+        offset=index,
+        seed=None if seed is None else seed + index,
+    )[0]
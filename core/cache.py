@@ -0,0 +1,182 @@
+# core/cache.py
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+# Политики кеша по методам: (TTL в секундах, максимум записей)
+CACHE_POLICIES: Dict[str, Tuple[float, int]] = {
+    "fans": (60.0, 256),
+    "fan_store": (60.0, 256),
+    "chat_history": (15.0, 4096),
+    "events_sync": (30.0, 1024),
+}
+
+DEFAULT_POLICY: Tuple[float, int] = (30.0, 1024)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+
+class TTLCache:
+    """
+    LRU-кеш с TTL на каждую запись.
+    Потокобезопасный: один экземпляр живёт на весь процесс и общий для всех сессий Streamlit.
+    """
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.stats = CacheStats()
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        Вернуть (найдено, значение). Просроченная запись удаляется и считается промахом.
+        """
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.stats.misses += 1
+                return False, None
+            expires_at, value = item
+            if expires_at <= now:
+                del self._data[key]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+            return True, value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        found, value = self.get(key)
+        if found:
+            return value
+        # Загрузка идёт вне блокировки, чтобы медленный upstream не тормозил другие ключи
+        value = loader()
+        self.set(key, value)
+        return value
+
+    def invalidate(self, predicate: Callable[[Hashable], bool] | None = None) -> int:
+        """
+        Удалить записи, для ключей которых predicate вернул True (без predicate — все).
+        Возвращает количество удалённых записей.
+        """
+        with self._lock:
+            if predicate is None:
+                removed = len(self._data)
+                self._data.clear()
+                return removed
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DataCache:
+    """
+    Кеш данных для core.data: отдельный TTLCache на каждый метод,
+    ключ внутри — (account, fan_id, params), где params — хешируемый кортеж
+    дополнительных аргументов запроса (курсор, limit и т.п.).
+    """
+
+    def __init__(self, policies: Dict[str, Tuple[float, int]] | None = None):
+        self._policies = dict(CACHE_POLICIES if policies is None else policies)
+        self._caches: Dict[str, TTLCache] = {}
+        self._lock = threading.Lock()
+
+    def _cache_for(self, method: str) -> TTLCache:
+        cache = self._caches.get(method)
+        if cache is None:
+            with self._lock:
+                cache = self._caches.get(method)
+                if cache is None:
+                    ttl, maxsize = self._policies.get(method, DEFAULT_POLICY)
+                    cache = TTLCache(ttl=ttl, maxsize=maxsize)
+                    self._caches[method] = cache
+        return cache
+
+    def get(
+        self,
+        method: str,
+        account: str | None,
+        fan_id: int | None,
+        params: Tuple = (),
+    ) -> Tuple[bool, Any]:
+        return self._cache_for(method).get((account, fan_id, params))
+
+    def set(
+        self,
+        method: str,
+        account: str | None,
+        fan_id: int | None,
+        value: Any,
+        params: Tuple = (),
+    ) -> None:
+        self._cache_for(method).set((account, fan_id, params), value)
+
+    def get_or_load(
+        self,
+        method: str,
+        account: str | None,
+        fan_id: int | None,
+        loader: Callable[[], Any],
+        params: Tuple = (),
+    ) -> Any:
+        return self._cache_for(method).get_or_load((account, fan_id, params), loader)
+
+    def invalidate(
+        self,
+        method: str | None = None,
+        account: str | None = None,
+        fan_id: int | None = None,
+    ) -> int:
+        """
+        Сбросить записи (со всеми params). None в любом аргументе означает «любой».
+        Пример: invalidate("chat_history", account, fan_id) после отправки сообщения.
+        """
+        def matches(key: Hashable) -> bool:
+            key_account, key_fan_id, _ = key
+            if account is not None and key_account != account:
+                return False
+            if fan_id is not None and key_fan_id != fan_id:
+                return False
+            return True
+
+        with self._lock:
+            targets = [self._caches[method]] if method in self._caches else (
+                [] if method is not None else list(self._caches.values())
+            )
+        return sum(cache.invalidate(matches) for cache in targets)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Счётчики попаданий/промахов по методам — для отладки и мониторинга.
+        """
+        with self._lock:
+            items = list(self._caches.items())
+        return {
+            method: {**asdict(cache.stats), "size": len(cache)}
+            for method, cache in items
+        }
@@ -0,0 +1,63 @@
+# core/chart_cache.py
+import functools
+import hashlib
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+
+from core.cache import TTLCache
+
+
+# Готовые фигуры общие для всех сессий: одинаковые данные — один и тот же объект
+_figure_cache = TTLCache(ttl=600.0, maxsize=256)
+
+
+def _feed(h: "hashlib._Hash", value: Any) -> None:
+    if isinstance(value, pd.DataFrame):
+        h.update(b"df")
+        h.update(repr((list(value.columns), [str(t) for t in value.dtypes])).encode())
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Series):
+        h.update(b"s")
+        h.update(repr((value.name, str(value.dtype))).encode())
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        h.update(b"nd")
+        h.update(repr((value.dtype.str, value.shape)).encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        h.update(b"(")
+        for item in value:
+            _feed(h, item)
+        h.update(b")")
+    elif isinstance(value, dict):
+        h.update(b"{")
+        for k in sorted(value, key=repr):
+            _feed(h, k)
+            _feed(h, value[k])
+        h.update(b"}")
+    else:
+        h.update(repr(value).encode())
+    h.update(b"|")
+
+
+def content_hash(*parts: Any) -> str:
+    """Хеш содержимого аргументов (датафреймы — по значениям, а не по id объекта)."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        _feed(h, part)
+    return h.hexdigest()
+
+
+def cached_figure(builder: Callable) -> Callable:
+    """
+    Мемоизация построения графика по хешу входных данных и параметров.
+    Возвращаемую фигуру нельзя менять на месте — она общая для всех сессий.
+    """
+    @functools.wraps(builder)
+    def wrapper(*args, **kwargs):
+        key = (builder.__module__, builder.__qualname__, content_hash(args, kwargs))
+        return _figure_cache.get_or_load(key, lambda: builder(*args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,159 @@
+# core/chat_store.py
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+
+Message = Dict[str, Any]
+
+
+@dataclass
+class ChatThread:
+    """
+    Локальная копия переписки с одним фаном.
+    messages отсортированы по id; complete=True — загружена вся история с начала.
+    """
+    messages: List[Message] = field(default_factory=list)
+    complete: bool = False
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def last_id(self) -> int | None:
+        return self.messages[-1]["id"] if self.messages else None
+
+    @property
+    def first_id(self) -> int | None:
+        return self.messages[0]["id"] if self.messages else None
+
+
+class ChatStore:
+    """
+    Хранилище сообщений по фанам: в памяти, опционально с копией на диске.
+    Запоминает последний полученный id и при синхронизации просит у API
+    только более новые сообщения.
+    """
+
+    def __init__(self, persist_dir: str | None = None):
+        self.persist_dir = Path(persist_dir) if persist_dir else None
+        self._threads: Dict[Tuple[str | None, int], ChatThread] = {}
+        self._lock = threading.Lock()
+
+    # ====== Доступ ======
+
+    def _thread(self, account: str | None, fan_id: int) -> ChatThread:
+        key = (account, int(fan_id))
+        with self._lock:
+            thread = self._threads.get(key)
+            if thread is None:
+                thread = self._load(account, fan_id) or ChatThread()
+                self._threads[key] = thread
+            return thread
+
+    def latest(
+        self,
+        account: str | None,
+        fan_id: int,
+        limit: int | None,
+        fetch_newer: Callable[[int | None, int | None], List[Message]],
+        from_id: int | None = None,
+    ) -> List[Message]:
+        """
+        Синхронизировать хвост переписки и вернуть limit последних сообщений,
+        а с from_id — все сообщения начиная с from_id (уже подгруженный диапазон).
+        fetch_newer(after_id, limit) должен вернуть сообщения новее after_id
+        (при after_id=None — limit последних).
+        """
+        thread = self._thread(account, fan_id)
+        with thread.lock:
+            if thread.last_id is None:
+                fetched = fetch_newer(None, limit)
+                thread.complete = limit is None or len(fetched) < limit
+            else:
+                fetched = fetch_newer(thread.last_id, None)
+            if fetched:
+                self._merge(thread, fetched)
+                self._save(account, fan_id, thread)
+            if from_id is not None:
+                return [m for m in thread.messages if m["id"] >= from_id]
+            return list(thread.messages[-limit:] if limit else thread.messages)
+
+    def older(
+        self,
+        account: str | None,
+        fan_id: int,
+        before_id: int,
+        limit: int | None,
+        fetch_older: Callable[[int, int | None], List[Message]],
+    ) -> List[Message]:
+        """
+        Страница сообщений старше before_id. Из API догружается только то,
+        чего ещё нет локально.
+        """
+        thread = self._thread(account, fan_id)
+        with thread.lock:
+            local = [m for m in thread.messages if m["id"] < before_id]
+            need_more = limit is None or len(local) < limit
+            if need_more and not thread.complete:
+                cursor = thread.first_id if thread.first_id is not None else before_id
+                cursor = min(cursor, before_id)
+                missing = None if limit is None else limit - len(local)
+                fetched = fetch_older(cursor, missing)
+                if missing is None or len(fetched) < missing:
+                    thread.complete = True
+                if fetched:
+                    self._merge(thread, fetched)
+                    self._save(account, fan_id, thread)
+                local = [m for m in thread.messages if m["id"] < before_id]
+            return local[-limit:] if limit else local
+
+    def forget(self, account: str | None = None, fan_id: int | None = None) -> None:
+        """Убрать переписки из памяти (файлы на диске остаются)."""
+        with self._lock:
+            for key in list(self._threads):
+                if account is not None and key[0] != account:
+                    continue
+                if fan_id is not None and key[1] != int(fan_id):
+                    continue
+                del self._threads[key]
+
+    @staticmethod
+    def _merge(thread: ChatThread, fetched: List[Message]) -> None:
+        if thread.messages and fetched[0]["id"] > thread.messages[-1]["id"]:
+            # Частый случай — пришли только новые сообщения
+            thread.messages.extend(fetched)
+            return
+        by_id = {m["id"]: m for m in thread.messages}
+        by_id.update((m["id"], m) for m in fetched)
+        thread.messages = [by_id[i] for i in sorted(by_id)]
+
+    # ====== Диск ======
+
+    def _path(self, account: str | None, fan_id: int) -> Path | None:
+        if self.persist_dir is None:
+            return None
+        return self.persist_dir / (account or "_default") / f"{int(fan_id)}.json"
+
+    def _load(self, account: str | None, fan_id: int) -> ChatThread | None:
+        path = self._path(account, fan_id)
+        if path is None or not path.exists():
+            return None
+        try:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return ChatThread(messages=payload.get("messages", []), complete=payload.get("complete", False))
+
+    def _save(self, account: str | None, fan_id: int, thread: ChatThread) -> None:
+        path = self._path(account, fan_id)
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps({"messages": thread.messages, "complete": thread.complete}, ensure_ascii=False),
+            encoding="utf-8",
+        )
+        os.replace(tmp, path)
@@ -0,0 +1,244 @@
+# core/cost_ledger.py
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+
+SUBMIT = "submit"
+SETTLE = "settle"
+EXPIRE = "expire"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ledger (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    event TEXT NOT NULL,
+    account TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    variants INTEGER NOT NULL,
+    tokens INTEGER NOT NULL,
+    estimated_cost REAL NOT NULL,
+    actual_cost REAL
+);
+CREATE INDEX IF NOT EXISTS ledger_job ON ledger (job_id);
+
+CREATE TABLE IF NOT EXISTS daily_costs (
+    account TEXT NOT NULL,
+    day TEXT NOT NULL,
+    jobs INTEGER NOT NULL DEFAULT 0,
+    reserved REAL NOT NULL DEFAULT 0,
+    actual REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (account, day)
+);
+
+CREATE TABLE IF NOT EXISTS open_jobs (
+    job_id TEXT PRIMARY KEY,
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    account TEXT NOT NULL,
+    estimated_cost REAL NOT NULL
+);
+"""
+
+
+class BudgetExceededError(Exception):
+    """Задача не помещается в оставшийся месячный бюджет аккаунта."""
+
+    def __init__(self, account: str, spent: float, estimate: float, budget: float):
+        self.account = account
+        self.spent = spent
+        self.estimate = estimate
+        self.budget = budget
+        super().__init__(
+            f"Бюджет аккаунта {account} исчерпан: потрачено ${spent:.2f} из ${budget:.2f}, "
+            f"задача стоит ~${estimate:.2f}"
+        )
+
+
+class CostLedger:
+    """
+    Журнал затрат на генерацию (SQLite).
+    ledger — только дописывается: строка submit с оценкой при постановке задачи
+    и строка settle с фактической стоимостью при завершении.
+    daily_costs — агрегаты по (аккаунт, день), обновляются в той же транзакции,
+    поэтому траты за месяц читаются по ≤31 строке без пересканирования журнала.
+    Пока задача не завершена, её оценка числится в reserved и уже занимает бюджет.
+    Незакрытые резервы лежат в open_jobs. Очередь задач живёт в памяти процесса,
+    поэтому при старте все они закрываются строкой expire (задачи потеряны при
+    рестарте), а резервы старше reservation_ttl не учитываются в тратах —
+    на случай, если settle так и не дошёл до журнала.
+    """
+
+    def __init__(self, path: str, reservation_ttl: float = 6 * 3600):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self.reservation_ttl = reservation_ttl
+        self.reconcile()
+
+    def reserve(
+        self,
+        account: str,
+        job_id: str,
+        model: str,
+        kind: str,
+        variants: int,
+        estimated_cost: float,
+        budget: float = 0.0,
+        tokens: int = 0,
+    ) -> None:
+        """
+        Проверить месячный бюджет (0 — без лимита) и записать постановку задачи.
+        Проверка и запись атомарны: параллельные задачи не проскочат лимит вдвоём.
+        tokens — справочно (если бэкенд считает в токенах), на бюджет не влияет.
+        """
+        now = time.time()
+        day = _day(now)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if budget > 0:
+                    spent = self._month_spend(account, day[:7], now - self.reservation_ttl)
+                    if spent + estimated_cost > budget:
+                        raise BudgetExceededError(account, spent, estimated_cost, budget)
+                self._conn.execute(
+                    "INSERT INTO ledger (ts, day, event, account, job_id, model, kind, variants, tokens, estimated_cost)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (now, day, SUBMIT, account, job_id, model, kind, variants, tokens, estimated_cost),
+                )
+                self._conn.execute(
+                    "INSERT INTO daily_costs (account, day, jobs, reserved) VALUES (?, ?, 1, ?)"
+                    " ON CONFLICT (account, day) DO UPDATE SET"
+                    " jobs = jobs + 1, reserved = reserved + excluded.reserved",
+                    (account, day, estimated_cost),
+                )
+                self._conn.execute(
+                    "INSERT INTO open_jobs (job_id, ts, day, account, estimated_cost) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, now, day, account, estimated_cost),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def settle(self, job_id: str, actual_cost: float) -> None:
+        """
+        Записать фактическую стоимость завершённой задачи: резерв снимается,
+        факт добавляется в тот же день, в который задача была поставлена.
+        Если резерв уже снят как просроченный, факт всё равно учитывается.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT event, day, account, model, kind, variants, tokens, estimated_cost"
+                    " FROM ledger WHERE job_id = ? ORDER BY id",
+                    (job_id,),
+                ).fetchall()
+                if not rows or rows[-1][0] == SETTLE:
+                    # Неизвестная или уже закрытая задача
+                    self._conn.execute("ROLLBACK")
+                    return
+                event, day, account, model, kind, variants, tokens, estimated = rows[-1]
+                reserved = estimated if event == SUBMIT else 0.0
+                self._conn.execute(
+                    "INSERT INTO ledger"
+                    " (ts, day, event, account, job_id, model, kind, variants, tokens, estimated_cost, actual_cost)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (time.time(), day, SETTLE, account, job_id, model, kind, variants, tokens, estimated, actual_cost),
+                )
+                self._conn.execute(
+                    "UPDATE daily_costs SET reserved = MAX(reserved - ?, 0), actual = actual + ?"
+                    " WHERE account = ? AND day = ?",
+                    (reserved, actual_cost, account, day),
+                )
+                self._conn.execute("DELETE FROM open_jobs WHERE job_id = ?", (job_id,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def reconcile(self, before: float | None = None) -> int:
+        """
+        Снять резервы незакрытых задач, поставленных раньше before (по умолчанию — все):
+        в журнал пишется строка expire, reserved в дневных агрегатах уменьшается.
+        Возвращает число снятых резервов.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                stale = self._conn.execute(
+                    "SELECT job_id, day, account, estimated_cost FROM open_jobs WHERE ts < ?",
+                    (time.time() if before is None else before,),
+                ).fetchall()
+                now = time.time()
+                for job_id, day, account, estimated in stale:
+                    self._conn.execute(
+                        "INSERT INTO ledger (ts, day, event, account, job_id, model, kind, variants, tokens, estimated_cost)"
+                        " SELECT ?, day, ?, account, job_id, model, kind, variants, tokens, estimated_cost"
+                        " FROM ledger WHERE job_id = ? AND event = ?",
+                        (now, EXPIRE, job_id, SUBMIT),
+                    )
+                    self._conn.execute(
+                        "UPDATE daily_costs SET reserved = MAX(reserved - ?, 0) WHERE account = ? AND day = ?",
+                        (estimated, account, day),
+                    )
+                    self._conn.execute("DELETE FROM open_jobs WHERE job_id = ?", (job_id,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(stale)
+
+    def _month_spend(self, account: str, month: str, stale_before: float | None = None) -> float:
+        bounds = (account, f"{month}-01", f"{month}-32")
+        (spent,) = self._conn.execute(
+            "SELECT COALESCE(SUM(actual + reserved), 0) FROM daily_costs"
+            " WHERE account = ? AND day >= ? AND day < ?",
+            bounds,
+        ).fetchone()
+        if stale_before is not None:
+            # Резервы, которые давно не закрыты, в трату не идут
+            (stale,) = self._conn.execute(
+                "SELECT COALESCE(SUM(estimated_cost), 0) FROM open_jobs"
+                " WHERE account = ? AND day >= ? AND day < ? AND ts < ?",
+                (*bounds, stale_before),
+            ).fetchone()
+            spent -= stale
+        return max(float(spent), 0.0)
+
+    def month_spend(self, account: str, month: str | None = None, include_stale: bool = False) -> float:
+        """
+        Траты аккаунта за месяц ("YYYY-MM", по умолчанию текущий), включая резервы.
+        Резервы старше reservation_ttl учитываются только с include_stale=True.
+        """
+        now = time.time()
+        stale_before = None if include_stale else now - self.reservation_ttl
+        with self._lock:
+            return self._month_spend(account, month or _day(now)[:7], stale_before)
+
+    def daily(self, account: str, start_day: str, end_day: str) -> List[Dict[str, float]]:
+        """Дневные агрегаты аккаунта за [start_day, end_day] ("YYYY-MM-DD")."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT day, jobs, reserved, actual FROM daily_costs"
+                " WHERE account = ? AND day BETWEEN ? AND ? ORDER BY day",
+                (account, start_day, end_day),
+            ).fetchall()
+        return [{"day": d, "jobs": j, "reserved": r, "actual": a} for d, j, r, a in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _day(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
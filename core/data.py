@@ -1,42 +1,688 @@
 # core/data.py
+import secrets
+import threading
+import uuid
+from typing import Any, Dict, Iterable, List, Tuple
+
 import pandas as pd
+from core.achievements import AchievementEngine, default_rules
+from core.aggregation import AggregationEngine
+from core.ai import generate_variant
+from core.cache import DataCache
+from core.chat_store import ChatStore
+from core.cost_ledger import CostLedger
+from core.fan_store import FanStore
+from core.forecast import ForecastEngine
+from core.jobs import GenerationJob, JobQueue
+from core.lora_registry import LoraRegistry
+from core.media_cache import MediaCache, media_key
+from core.media_preview import build_previews
+from core.prefetch import ChatPrefetcher
+from core.rollups import RollupStore, day_number
+from core.topk import LeaderboardStore
 from core.onlyfans_client import OnlyFansClient
+from core.outbox import Outbox, OutboxMessage
+from core.utils import get_settings
 
 
 _client: OnlyFansClient | None = None
+_cache: DataCache | None = None
+_chat_store: ChatStore | None = None
+_prefetcher: ChatPrefetcher | None = None
+_outbox: Outbox | None = None
+_engine: AggregationEngine | None = None
+_rollups: RollupStore | None = None
+_leaderboards: LeaderboardStore | None = None
+_achievements: AchievementEngine | None = None
+_forecasts: ForecastEngine | None = None
+_jobs: JobQueue | None = None
+_media_cache: MediaCache | None = None
+_loras: LoraRegistry | None = None
+_ledger: CostLedger | None = None
+_client_lock = threading.Lock()
 
 
 def get_client() -> OnlyFansClient:
     """
     Ленивая инициализация клиента.
+    Клиент (и его пул соединений) один на процесс и общий для всех сессий Streamlit.
     Потом сюда можно передать api_key, настройки прокси и т.п.
     """
     global _client
     if _client is None:
-        _client = OnlyFansClient(api_key=None)
+        with _client_lock:
+            if _client is None:
+                _client = OnlyFansClient(api_key=None)
     return _client
 
 
+def get_cache() -> DataCache:
+    """
+    Общий на процесс кеш ответов клиента (для всех сессий Streamlit).
+    """
+    global _cache
+    if _cache is None:
+        with _client_lock:
+            if _cache is None:
+                _cache = DataCache()
+    return _cache
+
+
+def get_chat_store() -> ChatStore:
+    """
+    Локальное хранилище переписок (в памяти, опционально на диске — CHAT_STORE_DIR).
+    """
+    global _chat_store
+    if _chat_store is None:
+        with _client_lock:
+            if _chat_store is None:
+                _chat_store = ChatStore(persist_dir=get_settings().chat_store_dir)
+    return _chat_store
+
+
 def get_fans_df(account: str) -> pd.DataFrame:
     """
     Публичный интерфейс для UI. Сейчас тянет данные из OnlyFansClient,
     позже внутри него будут реальные запросы к API/БД.
+    Ответ кешируется по аккаунту, поэтому rerun не ходит в API повторно.
     """
-    client = get_client()
-    return client.fetch_fans(account)
+    return get_cache().get_or_load(
+        "fans", account, None, lambda: get_client().fetch_fans(account)
+    )
 
 
-def get_chat_history(fan_id: int):
+def get_fan_store(account: str) -> FanStore:
     """
-    История чата для UI.
+    Фаны аккаунта в колоночном виде с индексами (по id, сегменту, доходу).
+    Строится один раз на каждое обновление get_fans_df и кешируется.
     """
-    client = get_client()
-    return client.fetch_chat_history(fan_id)
+    return get_cache().get_or_load(
+        "fan_store", account, None, lambda: FanStore(get_fans_df(account))
+    )
 
 
-def get_analytics_data(account: str):
+def get_fan(account: str, fan_id: int) -> Dict[str, Any] | None:
     """
-    Данные аналитики для UI.
+    Один фан по id (O(1) через индекс FanStore).
     """
+    return get_fan_store(account).get(fan_id)
+
+
+def search_fans(
+    account: str,
+    query: str = "",
+    segments: Iterable[str] | None = None,
+    sort_by: str = "revenue",
+    offset: int = 0,
+    limit: int = 20,
+) -> Tuple[pd.DataFrame, int]:
+    """
+    Поиск фанов на стороне данных: фильтр по имени и сегментам, сортировка,
+    окно offset/limit. Возвращает (страница, всего найдено) — UI рисует только страницу.
+    sort_by: "revenue" (по убыванию дохода), "unread" (сначала с новыми сообщениями), "name".
+    """
+    return get_fan_store(account).search(query, segments, sort_by, offset, limit)
+
+
+def get_chat_history(
+    fan_id: int,
+    account: str | None = None,
+    before_id: int | None = None,
+    limit: int | None = None,
+    from_id: int | None = None,
+):
+    """
+    История чата для UI. С before_id/limit — одна страница:
+    limit сообщений, предшествующих before_id (без before_id — самые свежие).
+    С from_id — всё от from_id до самого свежего (для ленты с подгруженными старыми страницами).
+    Сообщения берутся из локального ChatStore, у API запрашиваются только
+    новые (после последнего известного id) или недостающие старые.
+    """
+    return get_cache().get_or_load(
+        "chat_history",
+        account,
+        fan_id,
+        lambda: _load_chat_history(fan_id, account, before_id, limit, from_id),
+        params=(before_id, limit, from_id),
+    )
+
+
+def _load_chat_history(
+    fan_id: int,
+    account: str | None,
+    before_id: int | None,
+    limit: int | None,
+    from_id: int | None = None,
+):
     client = get_client()
-    return client.fetch_analytics(account)
+    store = get_chat_store()
+    if before_id is None:
+        return store.latest(
+            account,
+            fan_id,
+            limit,
+            lambda after_id, n: client.fetch_chat_history(fan_id, limit=n, after_id=after_id),
+            from_id,
+        )
+    return store.older(
+        account,
+        fan_id,
+        before_id,
+        limit,
+        lambda cursor, n: client.fetch_chat_history(fan_id, before_id=cursor, limit=n),
+    )
+
+
+def get_engine() -> AggregationEngine:
+    """
+    Журналы событий и агрегаты аналитики (общие на процесс).
+    """
+    global _engine
+    if _engine is None:
+        with _client_lock:
+            if _engine is None:
+                _engine = AggregationEngine()
+    return _engine
+
+
+def sync_events(account: str) -> None:
+    """
+    Догрузить новые события аккаунта (только новее последнего известного id).
+    Не чаще раза в TTL "events_sync" — частые rerun'ы не ходят в API.
+    """
+    def load():
+        log = get_engine().log(account)
+        _ingest_events(account, get_client().fetch_events(account, since_id=log.last_id))
+        return True
+
+    get_cache().get_or_load("events_sync", account, None, load)
+
+
+def sync_events_batch(accounts: Iterable[str]) -> Dict[str, Exception]:
+    """
+    То же для нескольких аккаунтов: догрузка идёт параллельно.
+    Ошибка одного аккаунта не роняет остальные — возвращается {account: ошибка}.
+    """
+    cache = get_cache()
+    engine = get_engine()
+    stale = [a for a in dict.fromkeys(accounts) if not cache.get("events_sync", a, None)[0]]
+    if not stale:
+        return {}
+    fetched = get_client().fetch_batch(
+        "events",
+        stale,
+        return_exceptions=True,
+        key_kwargs={a: {"since_id": engine.log(a).last_id} for a in stale},
+    )
+    errors = {}
+    for account, events in fetched.items():
+        if isinstance(events, Exception):
+            errors[account] = events
+            continue
+        _ingest_events(account, events)
+        cache.set("events_sync", account, None, True)
+    return errors
+
+
+def get_rollups() -> RollupStore:
+    """
+    Инкрементальные дневные агрегаты (KPI) по аккаунтам.
+    """
+    global _rollups
+    if _rollups is None:
+        with _client_lock:
+            if _rollups is None:
+                _rollups = RollupStore()
+    return _rollups
+
+
+def get_leaderboards() -> LeaderboardStore:
+    """
+    Потоковые топы фанов по донатам по аккаунтам.
+    """
+    global _leaderboards
+    if _leaderboards is None:
+        with _client_lock:
+            if _leaderboards is None:
+                _leaderboards = LeaderboardStore()
+    return _leaderboards
+
+
+def _ingest_events(account: str, events: pd.DataFrame) -> pd.DataFrame:
+    """
+    Единая точка приёма новых событий: журнал + все инкрементальные агрегаты.
+    """
+    new_events = get_engine().ingest(account, events)
+    if not new_events.empty:
+        get_rollups().ingest(account, new_events)
+        get_leaderboards().ingest(account, new_events)
+    return new_events
+
+
+def get_top_fans(account: str, k: int = 3, window: str = "all") -> List[Dict[str, Any]]:
+    """
+    Топ-k фанов по донатам: window="all" — за всё время, "week" — за текущую неделю.
+    Имена подставляются из FanStore; неизвестные фаны показываются по id.
+    """
+    sync_events(account)
+    fans = get_fan_store(account)
+    result = []
+    for rank, (fan_id, amount) in enumerate(get_leaderboards().get(account).top(k, window), start=1):
+        fan = fans.get(fan_id)
+        result.append({
+            "rank": rank,
+            "fan_id": fan_id,
+            "name": fan["name"] if fan else f"Fan #{fan_id}",
+            "amount": amount,
+        })
+    return result
+
+
+def get_kpis(
+    account: str,
+    start: pd.Timestamp | None = None,
+    end: pd.Timestamp | None = None,
+) -> Dict[str, float]:
+    """
+    KPI для карточек аналитики за [start, end) — читаются из
+    материализованных дневных агрегатов за O(1), независимо от длины истории.
+    """
+    sync_events(account)
+    if start is None or end is None:
+        start, end = default_analytics_range()
+    return get_rollups().get(account).kpis(day_number(start), day_number(end))
+
+
+def get_achievement_engine() -> AchievementEngine:
+    """
+    Движок достижений с мемоизацией по (account, неделя).
+    """
+    global _achievements
+    if _achievements is None:
+        with _client_lock:
+            if _achievements is None:
+                _achievements = AchievementEngine()
+    return _achievements
+
+
+def get_week_achievements(
+    account: str,
+    day: pd.Timestamp | None = None,
+    weekly_revenue_goal: float = 0.0,
+) -> List[Dict[str, str]]:
+    """
+    Вычисленные достижения недели (с понедельника), в которую попадает day,
+    за дни до day включительно. Дневной план по доходу — weekly_revenue_goal / 7.
+    """
+    sync_events(account)
+    day = pd.Timestamp.now().normalize() if day is None else pd.Timestamp(day).normalize()
+    day_no = day_number(day)
+    week_start = day_no - day.dayofweek
+    rules = default_rules(round(weekly_revenue_goal / 7, 2))
+    # Копия: список из кеша общий для всех сессий, а UI дописывает в него цели
+    return list(get_achievement_engine().evaluate(
+        account, get_rollups().get(account), week_start, day_no - week_start + 1, rules
+    ))
+
+
+def get_forecast_engine() -> ForecastEngine:
+    """
+    Прогнозы дохода/подписчиков с инкрементально дообучаемыми моделями.
+    """
+    global _forecasts
+    if _forecasts is None:
+        with _client_lock:
+            if _forecasts is None:
+                _forecasts = ForecastEngine()
+    return _forecasts
+
+
+def get_forecast(
+    account: str,
+    start: pd.Timestamp | None = None,
+    end: pd.Timestamp | None = None,
+    fields: Tuple[str, ...] = ("revenue", "subs"),
+) -> Dict[str, Dict[str, float]]:
+    """
+    Проекция полей на конец периода [start, end): {поле: {actual, total, total_sd, last_day, last_day_sd}}.
+    """
+    sync_events(account)
+    if start is None or end is None:
+        start, end = default_analytics_range()
+    rollup = get_rollups().get(account)
+    today = day_number(pd.Timestamp.now())
+    engine = get_forecast_engine()
+    return {
+        f: engine.project(account, f, rollup, day_number(start), day_number(end), today)
+        for f in fields
+    }
+
+
+def default_analytics_range(days: int = 7) -> Tuple[pd.Timestamp, pd.Timestamp]:
+    """
+    Диапазон по умолчанию: последние days дней, включая сегодняшний.
+    """
+    end = pd.Timestamp.now().normalize() + pd.Timedelta(days=1)
+    return end - pd.Timedelta(days=days), end
+
+
+def get_analytics_data(
+    account: str,
+    start: pd.Timestamp | None = None,
+    end: pd.Timestamp | None = None,
+    granularity: str = "day",
+) -> pd.DataFrame:
+    """
+    Данные аналитики для UI: агрегаты по бакетам (hour/day/week/month)
+    за [start, end). Колонки: day, revenue, subs, avg_watch, tips, watch_sessions.
+    """
+    sync_events(account)
+    if start is None or end is None:
+        start, end = default_analytics_range()
+    return get_engine().rollup(account, start, end, granularity)
+
+
+def _get_batch(
+    method: str,
+    keys: List[Any],
+    account_of,
+    fan_id_of,
+    params: tuple = (),
+) -> Dict[Any, Any]:
+    """
+    Батч-загрузка с учётом кеша: из API параллельно тянутся только промахи.
+    """
+    cache = get_cache()
+    result: Dict[Any, Any] = {}
+    missing: List[Any] = []
+    for key in keys:
+        found, value = cache.get(method, account_of(key), fan_id_of(key), params)
+        if found:
+            result[key] = value
+        else:
+            missing.append(key)
+
+    if missing:
+        fetched = get_client().fetch_batch(method, missing)
+        for key, value in fetched.items():
+            cache.set(method, account_of(key), fan_id_of(key), value, params)
+            result[key] = value
+    return {key: result[key] for key in keys}
+
+
+def get_fans_batch(accounts: Iterable[str]) -> Dict[str, pd.DataFrame]:
+    """
+    Фаны сразу нескольких аккаунтов (для обзорных экранов), параллельно.
+    """
+    return _get_batch("fans", list(dict.fromkeys(accounts)), lambda a: a, lambda a: None)
+
+
+def get_chat_histories_batch(fan_ids: Iterable[int], account: str | None = None) -> Dict[int, list]:
+    """
+    Истории чатов нескольких фанов, параллельно.
+    """
+    return _get_batch(
+        "chat_history",
+        list(dict.fromkeys(fan_ids)),
+        lambda f: account,
+        lambda f: f,
+        params=(None, None),
+    )
+
+
+def get_analytics_batch(
+    accounts: Iterable[str],
+    start: pd.Timestamp | None = None,
+    end: pd.Timestamp | None = None,
+    granularity: str = "day",
+) -> Dict[str, pd.DataFrame]:
+    """
+    Аналитика нескольких аккаунтов: события догружаются параллельно.
+    """
+    accounts = list(dict.fromkeys(accounts))
+    sync_events_batch(accounts)
+    return {
+        account: get_analytics_data(account, start, end, granularity)
+        for account in accounts
+    }
+
+
+def get_portfolio_kpis(
+    accounts: Iterable[str],
+    start: pd.Timestamp | None = None,
+    end: pd.Timestamp | None = None,
+) -> Tuple[pd.DataFrame, Dict[str, Exception]]:
+    """
+    KPI всех аккаунтов за [start, end) одной таблицей (строка — аккаунт).
+    События догружаются параллельно, сами KPI читаются из дневных агрегатов за O(1)
+    на аккаунт. Колонки watch_sum/watch_count нужны для взвешенного avg_watch по портфелю.
+    Возвращает (таблица, {account: ошибка догрузки}) — строки таких аккаунтов
+    неполные, и UI не должен выдавать их за нулевой доход.
+    """
+    accounts = list(dict.fromkeys(accounts))
+    errors = sync_events_batch(accounts)
+    if start is None or end is None:
+        start, end = default_analytics_range()
+    start_day, end_day = day_number(start), day_number(end)
+    rows = []
+    for account in accounts:
+        rollup = get_rollups().get(account)
+        row = {"account": account, **rollup.kpis(start_day, end_day)}
+        row["watch_sum"] = rollup.total("watch_sum", start_day, end_day)
+        row["watch_count"] = rollup.total("watch_count", start_day, end_day)
+        rows.append(row)
+    return pd.DataFrame(rows), errors
+
+
+def get_portfolio_series(
+    accounts: Iterable[str],
+    field: str = "revenue",
+    start: pd.Timestamp | None = None,
+    end: pd.Timestamp | None = None,
+) -> Tuple[pd.DataFrame, Dict[str, Exception]]:
+    """
+    Дневной ряд поля по аккаунтам: индекс — день, колонки — аккаунты.
+    Берётся срезами из дневных агрегатов, без повторной агрегации событий.
+    Возвращает (ряды, {account: ошибка догрузки}).
+    """
+    accounts = list(dict.fromkeys(accounts))
+    errors = sync_events_batch(accounts)
+    if start is None or end is None:
+        start, end = default_analytics_range()
+    start_day, end_day = day_number(start), day_number(end)
+    rollups = get_rollups()
+    series = pd.DataFrame(
+        {account: rollups.get(account).series(field, start_day, end_day) for account in accounts},
+        index=pd.date_range(pd.Timestamp(start).normalize(), periods=max(end_day - start_day, 0), freq="D"),
+    )
+    return series, errors
+
+
+def get_prefetcher() -> ChatPrefetcher:
+    """
+    Общий фоновый прогревщик историй чатов.
+    """
+    global _prefetcher
+    if _prefetcher is None:
+        with _client_lock:
+            if _prefetcher is None:
+                _prefetcher = ChatPrefetcher(
+                    lambda account, fan_id, limit: get_chat_history(fan_id, account, limit=limit)
+                )
+    return _prefetcher
+
+
+def prefetch_chat_histories(scope: str, account: str, fan_ids: Iterable[int], limit: int | None = None) -> int:
+    """
+    Прогреть кеш историй чатов для fan_ids в фоне, не блокируя rerun.
+    limit должен совпадать со страницей, которую потом запросит UI.
+    scope — идентификатор сессии оператора: смена аккаунта в нём отменяет старые задачи.
+    """
+    return get_prefetcher().prefetch(scope, account, fan_ids, limit)
+
+
+def get_outbox() -> Outbox:
+    """
+    Общая очередь исходящих сообщений. После успешной отправки
+    кеш истории этого фана сбрасывается, и следующий rerun подтянет новое сообщение.
+    """
+    global _outbox
+    if _outbox is None:
+        with _client_lock:
+            if _outbox is None:
+                _outbox = Outbox(
+                    sender=lambda account, fan_id, text, key: get_client().send_message(fan_id, text, key),
+                    on_sent=lambda message: invalidate_chat_history(message.fan_id, message.account),
+                )
+    return _outbox
+
+
+def send_message(account: str, fan_id: int, text: str, idempotency_key: str | None = None) -> OutboxMessage:
+    """
+    Поставить сообщение в очередь на отправку (не блокирует UI).
+    """
+    return get_outbox().enqueue(account, fan_id, text, idempotency_key)
+
+
+def get_job_queue() -> JobQueue:
+    """
+    Очередь задач генерации контента (общая для процесса).
+    """
+    global _jobs
+    if _jobs is None:
+        with _client_lock:
+            if _jobs is None:
+                settings = get_settings()
+                _jobs = JobQueue(
+                    _run_generation_variant,
+                    on_finish=_settle_generation,
+                    workers=settings.generation_workers,
+                    model_limit=settings.generation_model_limit,
+                    model_limits=settings.generation_model_limits,
+                )
+    return _jobs
+
+
+def get_media_cache() -> MediaCache:
+    """
+    Дисковый кеш результатов генерации по хешу параметров и seed.
+    """
+    global _media_cache
+    if _media_cache is None:
+        with _client_lock:
+            if _media_cache is None:
+                settings = get_settings()
+                _media_cache = MediaCache(settings.media_cache_dir, settings.media_cache_max_mb * 1024 * 1024)
+    return _media_cache
+
+
+def get_lora_registry() -> LoraRegistry:
+    """
+    Реестр LoRA: загруженные файлы по хешу + индекс метаданных.
+    """
+    global _loras
+    if _loras is None:
+        with _client_lock:
+            if _loras is None:
+                _loras = LoraRegistry(get_settings().lora_dir)
+    return _loras
+
+
+def _run_generation_variant(job: GenerationJob, index: int) -> Dict[str, str | None]:
+    """
+    Вариант задачи: из кеша, если такой (параметры, seed, номер) уже генерировался,
+    плюс превью для сетки — {"url", "thumb", "preview"}.
+    """
+    cache = get_media_cache()
+    settings = get_settings()
+    key = media_key({**job.params, "kind": job.kind}, job.params["seed"], index)
+    generated = []
+
+    def produce():
+        generated.append(True)
+        return generate_variant(job.kind, job.params, index)
+
+    original = cache.get_or_create(key, produce, ext=".png" if job.kind == "image" else ".mp4")
+    previews = build_previews(job.kind, original, settings.thumbnail_size, settings.video_preview_seconds)
+    if previews["thumb"] or previews["preview"]:
+        cache.refresh_size(key)
+    # Попадание в кеш бэкенд не вызывает — в журнал затрат такой вариант идёт бесплатно
+    return {**previews, "cached": not generated}
+
+
+def new_generation_seed() -> int:
+    return secrets.randbelow(2**31)
+
+
+def get_cost_ledger() -> CostLedger:
+    """
+    Журнал затрат на генерацию с дневными агрегатами по аккаунтам.
+    """
+    global _ledger
+    if _ledger is None:
+        with _client_lock:
+            if _ledger is None:
+                settings = get_settings()
+                _ledger = CostLedger(
+                    settings.cost_ledger_path,
+                    reservation_ttl=settings.cost_reservation_ttl_hours * 3600,
+                )
+    return _ledger
+
+
+def get_generation_budget(account: str) -> float:
+    """Месячный бюджет аккаунта на генерацию ($, 0 — без лимита)."""
+    settings = get_settings()
+    return settings.generation_budgets.get(account, settings.generation_monthly_budget)
+
+
+def get_variant_price(model_name: str) -> float:
+    """Цена одного варианта модели ($) из настроек сервера — не из параметров UI."""
+    settings = get_settings()
+    return settings.generation_prices.get(model_name, settings.generation_default_price)
+
+
+def _settle_generation(job: GenerationJob) -> None:
+    """Фактическая стоимость: только реально сгенерированные варианты (без попаданий в кеш)."""
+    generated = sum(1 for r in job.results if not r.get("cached"))
+    get_cost_ledger().settle(job.id, generated * get_variant_price(job.model_name))
+
+
+def submit_generation(account: str, kind: str, params: Dict[str, Any]) -> GenerationJob:
+    """
+    Поставить генерацию в очередь; результаты появляются в job.results по мере готовности.
+    Без явного params["seed"] выбирается случайный — такой запуск мимо кеша.
+    Стоимость (n_variants × цена модели из настроек) сначала резервируется
+    в журнале затрат; не помещается в бюджет — BudgetExceededError.
+    """
+    params = dict(params)
+    if params.get("seed") is None:
+        params["seed"] = new_generation_seed()
+    n = int(params["n_variants"])
+    if n < 1:
+        raise ValueError(f"Некорректное число вариантов: {n}")
+    job_id = uuid.uuid4().hex
+    get_cost_ledger().reserve(
+        account,
+        job_id,
+        params["model_name"],
+        kind,
+        n,
+        get_variant_price(params["model_name"]) * n,
+        budget=get_generation_budget(account),
+    )
+    return get_job_queue().submit(account, kind, params["model_name"], params, n, job_id=job_id)
+
+
+def invalidate_chat_history(fan_id: int, account: str | None = None) -> None:
+    """
+    Сбросить кеш истории чата (например, после отправки сообщения).
+    """
+    get_cache().invalidate("chat_history", account, fan_id)
+
+
+def invalidate_account(account: str) -> None:
+    """
+    Сбросить все закешированные данные аккаунта.
+    """
+    get_cache().invalidate(account=account)
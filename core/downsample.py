@@ -0,0 +1,77 @@
+# core/downsample.py
+import numpy as np
+import pandas as pd
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: индексы threshold точек ряда,
+    визуально лучше всего сохраняющих форму линии. Первая и последняя точка всегда входят.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Границы бакетов для внутренних точек (без первой и последней)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Средняя точка следующего бакета (для последнего — последняя точка ряда)
+        if i + 2 < len(edges):
+            nlo, nhi = edges[i + 1], edges[i + 2]
+            avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        # Площадь треугольника (prev, кандидат, среднее следующего бакета) — векторно
+        area = np.abs(
+            (x[prev] - avg_x) * (y[lo:hi] - y[prev])
+            - (x[prev] - x[lo:hi]) * (avg_y - y[prev])
+        )
+        prev = lo + int(np.argmax(area))
+        selected[i + 1] = prev
+    return selected
+
+
+def minmax_indices(y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Min/max-децимация: в каждом из threshold/2 бакетов оставляем минимум и максимум.
+    Дешевле LTTB и сохраняет пики — подходит для столбчатых графиков.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+    n_buckets = threshold // 2
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    starts = edges[:-1]
+    bucket = np.repeat(np.arange(n_buckets), np.diff(edges))
+    # argmin/argmax внутри бакетов через сортировку по (бакет, значение)
+    order = np.lexsort((y, bucket))
+    ends = np.cumsum(np.diff(edges))
+    mins = order[starts]
+    maxs = order[ends - 1]
+    return np.unique(np.concatenate([mins, maxs]))
+
+
+def downsample(frame: pd.DataFrame, x: str, y: str, max_points: int, method: str = "lttb") -> pd.DataFrame:
+    """
+    Оставить в frame не больше max_points строк по ряду y (x — ось времени).
+    method: "lttb" для линий, "minmax" для столбцов.
+    """
+    if len(frame) <= max_points:
+        return frame
+    if method == "minmax":
+        idx = minmax_indices(frame[y].to_numpy(), max_points)
+    else:
+        xs = frame[x].to_numpy()
+        if np.issubdtype(xs.dtype, np.datetime64):
+            xs = xs.astype("datetime64[ns]").astype(np.int64)
+        idx = lttb_indices(xs, frame[y].to_numpy(), max_points)
+    return frame.iloc[idx]
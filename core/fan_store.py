@@ -0,0 +1,129 @@
+# core/fan_store.py
+from typing import Any, Dict, Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+SEGMENTS = ["VIP", "Buyer", "Free"]
+
+
+class FanStore:
+    """
+    Компактное колоночное хранилище фанов аккаунта с готовыми индексами:
+    id -> позиция, сегмент -> позиции, порядки сортировки (доход, непрочитанные, имя).
+    Поиск по id — O(1), фильтр по сегментам — O(k) от размера сегментов,
+    без полного прохода по таблице.
+    """
+
+    def __init__(self, fans: pd.DataFrame):
+        self.ids = fans["id"].to_numpy(dtype=np.int64)
+        self.names = fans["name"].astype(str).to_numpy(dtype=object)
+        categories = SEGMENTS + sorted(set(fans["segment"].unique()) - set(SEGMENTS))
+        self.segments = pd.Categorical(fans["segment"], categories=categories)
+        self.revenue = fans["revenue"].to_numpy(dtype=np.float32)
+        self.has_new = fans["has_new"].to_numpy(dtype=bool)
+        self._names_lower = np.array([n.lower() for n in self.names], dtype=object)
+
+        # id -> позиция
+        self._pos: Dict[int, int] = {int(fan_id): i for i, fan_id in enumerate(self.ids)}
+
+        # сегмент -> позиции
+        codes = self.segments.codes
+        self._by_segment: Dict[str, np.ndarray] = {
+            segment: np.flatnonzero(codes == code)
+            for code, segment in enumerate(self.segments.categories)
+        }
+
+        # Порядки сортировки и ранги позиций в них
+        self._orders: Dict[str, np.ndarray] = {
+            "revenue": np.argsort(-self.revenue, kind="stable"),
+            "unread": np.lexsort((-self.revenue, ~self.has_new)),
+            "name": np.argsort(self._names_lower, kind="stable"),
+        }
+        self._ranks: Dict[str, np.ndarray] = {}
+        for sort_by, order in self._orders.items():
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            self._ranks[sort_by] = rank
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def get(self, fan_id: int) -> Dict[str, Any] | None:
+        """Фан по id в виде словаря или None."""
+        pos = self._pos.get(int(fan_id))
+        if pos is None:
+            return None
+        return {
+            "id": int(self.ids[pos]),
+            "name": self.names[pos],
+            "segment": self.segments[pos],
+            "revenue": float(self.revenue[pos]),
+            "has_new": bool(self.has_new[pos]),
+        }
+
+    def __contains__(self, fan_id: int) -> bool:
+        return int(fan_id) in self._pos
+
+    def positions(self, segments: Iterable[str] | None = None, sort_by: str = "revenue") -> np.ndarray:
+        """
+        Позиции фанов из заданных сегментов (все, если сегменты не заданы)
+        в порядке sort_by.
+        """
+        order = self._orders.get(sort_by, self._orders["revenue"])
+        segments = list(segments or ())
+        if not segments:
+            return order
+        parts = [self._by_segment[s] for s in segments if s in self._by_segment]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        candidates = np.concatenate(parts)
+        rank = self._ranks.get(sort_by, self._ranks["revenue"])
+        return candidates[np.argsort(rank[candidates], kind="stable")]
+
+    def likely_next(
+        self,
+        segments: Iterable[str] | None = None,
+        k: int = 5,
+        exclude: int | None = None,
+    ) -> list:
+        """
+        id фанов, которых оператор скорее всего откроет следующими:
+        сначала с непрочитанными сообщениями, затем VIP по доходу.
+        """
+        positions = self.positions(segments, "unread")[: k + 1]
+        picked = [int(i) for i in self.ids[positions[self.has_new[positions]]]]
+        if len(picked) < k + 1 and "VIP" in self._by_segment and (not segments or "VIP" in segments):
+            vip = self._by_segment["VIP"]
+            vip = vip[np.argsort(self._ranks["revenue"][vip], kind="stable")][: k + 1]
+            picked += [int(i) for i in self.ids[vip] if int(i) not in picked]
+        return [fan_id for fan_id in picked if fan_id != exclude][:k]
+
+    def search(
+        self,
+        query: str = "",
+        segments: Iterable[str] | None = None,
+        sort_by: str = "revenue",
+        offset: int = 0,
+        limit: int = 20,
+    ) -> Tuple[pd.DataFrame, int]:
+        """
+        Поиск по подстроке имени внутри сегментов. Возвращает (страница, всего найдено).
+        """
+        positions = self.positions(segments, sort_by)
+        query = query.strip().lower()
+        if query and len(positions):
+            matches = pd.Series(self._names_lower[positions]).str.contains(query, regex=False)
+            positions = positions[matches.to_numpy(dtype=bool)]
+        return self.frame(positions[offset:offset + limit]), len(positions)
+
+    def frame(self, positions: np.ndarray) -> pd.DataFrame:
+        """DataFrame с колонками id, name, segment, revenue, has_new для позиций."""
+        return pd.DataFrame({
+            "id": self.ids[positions],
+            "name": self.names[positions],
+            "segment": np.asarray(self.segments[positions], dtype=object),
+            "revenue": self.revenue[positions],
+            "has_new": self.has_new[positions],
+        })
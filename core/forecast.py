@@ -0,0 +1,188 @@
+# core/forecast.py
+import math
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+
+import numpy as np
+
+from core.aggregation import _WEEK_SHIFT_DAYS
+from core.rollups import DailyRollup
+
+
+SEASON = 7
+# Сколько последних учтённых дней сверяем с агрегатами, чтобы заметить поздние события
+_CHECK_TAIL = 14
+# z-квантиль для полос прогноза (80%)
+BAND_Z = 1.2816
+
+
+def weekday_index(days: np.ndarray) -> np.ndarray:
+    """День недели (пн = 0) по номеру дня от эпохи."""
+    return (np.asarray(days) + _WEEK_SHIFT_DAYS) % SEASON
+
+
+@dataclass
+class SmoothingState:
+    """
+    Состояние аддитивного экспоненциального сглаживания с недельной сезонностью:
+    уровень + поправки по дням недели + накопленная ошибка одношагового прогноза.
+    """
+    level: float
+    seasonal: np.ndarray  # 7 поправок, индекс — день недели (пн = 0)
+    next_day: int  # первый ещё не учтённый день
+    first_day: int  # с какого дня обучена модель
+    sse: float = 0.0
+    n_errors: int = 0
+    tail: np.ndarray = field(default_factory=lambda: np.zeros(0))
+
+    @property
+    def sigma(self) -> float:
+        return math.sqrt(self.sse / self.n_errors) if self.n_errors else 0.0
+
+
+class SeasonalSmoother:
+    """
+    Экспоненциальное сглаживание (модель ANA): уровень без тренда + сезонность по дням недели.
+    Обновление — O(1) на новый день, поэтому модель дообучается инкрементально.
+    """
+
+    def __init__(self, alpha: float = 0.2, gamma: float = 0.1):
+        self.alpha = alpha
+        self.gamma = gamma
+
+    def fit(self, values: np.ndarray, first_day: int) -> SmoothingState:
+        """Начальная подгонка по всему ряду, начиная с first_day."""
+        # Инициализация по первым двум неделям (или по тому, что есть)
+        warmup = values[: 2 * SEASON]
+        level = float(warmup.mean()) if len(warmup) else 0.0
+        seasonal = np.zeros(SEASON)
+        if len(warmup) >= SEASON:
+            weekdays = weekday_index(np.arange(first_day, first_day + len(warmup)))
+            sums = np.bincount(weekdays, weights=warmup - level, minlength=SEASON)
+            counts = np.bincount(weekdays, minlength=SEASON)
+            seasonal = np.divide(sums, counts, out=np.zeros(SEASON), where=counts > 0)
+        state = SmoothingState(level=level, seasonal=seasonal, next_day=first_day, first_day=first_day)
+        return self.update(state, values)
+
+    def update(self, state: SmoothingState, values: np.ndarray) -> SmoothingState:
+        """Учесть дни [state.next_day, state.next_day + len(values))."""
+        weekdays = weekday_index(np.arange(state.next_day, state.next_day + len(values)))
+        level, seasonal = state.level, state.seasonal.copy()
+        sse, n_errors = state.sse, state.n_errors
+        for y, w in zip(values, weekdays):
+            err = y - (level + seasonal[w])
+            sse += err * err
+            n_errors += 1
+            level += self.alpha * err
+            seasonal[w] += self.gamma * (y - level - seasonal[w])
+        tail = np.concatenate([state.tail, values])[-_CHECK_TAIL:]
+        return SmoothingState(
+            level=level,
+            seasonal=seasonal,
+            next_day=state.next_day + len(values),
+            first_day=state.first_day,
+            sse=sse,
+            n_errors=n_errors,
+            tail=tail,
+        )
+
+    def forecast(self, state: SmoothingState, horizon: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Прогноз на horizon дней начиная с state.next_day: (среднее, СКО) по дням.
+        Дисперсия h-шагового прогноза для модели ANA:
+        sigma² * (1 + (h-1)·alpha² + k·gamma·(2·alpha + gamma)), k — число полных сезонов в h-1.
+        """
+        h = np.arange(1, horizon + 1)
+        mean = state.level + state.seasonal[weekday_index(state.next_day + h - 1)]
+        k = (h - 1) // SEASON
+        var = state.sigma ** 2 * (
+            1 + (h - 1) * self.alpha ** 2 + k * self.gamma * (2 * self.alpha + self.gamma)
+        )
+        return mean, np.sqrt(var)
+
+
+class ForecastEngine:
+    """
+    Прогнозы по (account, поле) поверх дневных агрегатов.
+    Состояние модели хранится и при новых днях только дообучается;
+    полная переподгонка — лишь если задним числом изменились уже учтённые дни.
+    """
+
+    def __init__(self, smoother: SeasonalSmoother | None = None):
+        self.smoother = smoother or SeasonalSmoother()
+        self._states: Dict[Tuple[str, str], Tuple[int, SmoothingState]] = {}
+        self._lock = threading.Lock()
+
+    def state(self, account: str, field: str, rollup: DailyRollup, today: int) -> SmoothingState | None:
+        """Модель, обученная на полных днях до today (сам today ещё не закончился)."""
+        if rollup.first_day is None or today <= rollup.first_day:
+            return None
+        key = (account, field)
+        with self._lock:
+            cached = self._states.get(key)
+            if cached is not None and cached[0] == rollup.version and cached[1].next_day == today:
+                return cached[1]
+
+            state = cached[1] if cached is not None else None
+            if state is not None:
+                checked = rollup.series(field, state.next_day - len(state.tail), state.next_day)
+                stale = state.first_day != rollup.first_day or state.next_day > today
+                if stale or not np.array_equal(checked, state.tail):
+                    state = None
+            if state is None:
+                state = self.smoother.fit(rollup.series(field, rollup.first_day, today), rollup.first_day)
+            elif state.next_day < today:
+                state = self.smoother.update(state, rollup.series(field, state.next_day, today))
+
+            self._states[key] = (rollup.version, state)
+            return state
+
+    def project(
+        self,
+        account: str,
+        field: str,
+        rollup: DailyRollup,
+        start_day: int,
+        end_day: int,
+        today: int,
+    ) -> Dict[str, float]:
+        """
+        Проекция поля на период [start_day, end_day): факт за прошедшие дни + прогноз
+        на оставшиеся (текущий день — не меньше уже набранного).
+        total — итог периода, last_day — значение последнего дня; *_sd — СКО.
+        Полосы суммы — приближение: корреляция ошибок между днями не учитывается.
+        """
+        observed = rollup.series(field, start_day, end_day)
+        result = {
+            "actual": float(observed.sum()),
+            "total": float(observed.sum()),
+            "total_sd": 0.0,
+            "last_day": float(observed[-1]) if len(observed) else 0.0,
+            "last_day_sd": 0.0,
+        }
+        state = self.state(account, field, rollup, today)
+        if state is None or end_day <= today:
+            return result
+
+        first = max(start_day, today)
+        mean, sd = self.smoother.forecast(state, end_day - today)
+        mean, sd = mean[first - today:], sd[first - today:]
+        mean = np.maximum(mean, 0.0)
+        if first == today:
+            mean[0] = max(mean[0], observed[today - start_day])
+        done = observed[: first - start_day].sum()
+        result.update({
+            "total": float(done + mean.sum()),
+            "total_sd": float(np.sqrt((sd ** 2).sum())),
+            "last_day": float(mean[-1]),
+            "last_day_sd": float(sd[-1]),
+        })
+        return result
+
+
+def goal_probability(projected: float, sd: float, target: float) -> float:
+    """Вероятность достичь target при нормальной ошибке прогноза."""
+    if sd <= 0:
+        return 1.0 if projected >= target else 0.0
+    return 0.5 * (1 + math.erf((projected - target) / (sd * math.sqrt(2))))
@@ -0,0 +1,190 @@
+# core/jobs.py
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List
+
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class GenerationJob:
+    id: str
+    account: str
+    kind: str  # "image" | "video"
+    model_name: str
+    params: Dict[str, Any]
+    n_variants: int
+    status: str = QUEUED
+    results: List[Any] = field(default_factory=list)
+    error: str | None = None
+    cancel_requested: bool = False
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+
+    @property
+    def progress(self) -> float:
+        return len(self.results) / self.n_variants if self.n_variants else 1.0
+
+
+class JobQueue:
+    """
+    Очередь задач генерации: submit сразу возвращает задачу, варианты генерируются
+    в пуле потоков. Одновременно на одной модели выполняется не больше её лимита —
+    задачи сверх лимита ждут в очереди, не занимая потоки пула, поэтому
+    перегруженная модель не блокирует остальные.
+    Варианты генерируются по одному: прогресс и готовые результаты видны сразу.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[GenerationJob, int], Any],
+        on_finish: Callable[[GenerationJob], None] | None = None,
+        workers: int = 4,
+        model_limit: int = 2,
+        model_limits: Dict[str, int] | None = None,
+        keep_finished: int = 200,
+        notify_attempts: int = 5,
+        notify_backoff: float = 0.5,
+    ):
+        self._runner = runner
+        self._on_finish = on_finish
+        self.workers = workers
+        self.model_limit = model_limit
+        self.model_limits = dict(model_limits or {})
+        self.keep_finished = keep_finished
+        self.notify_attempts = notify_attempts
+        self.notify_backoff = notify_backoff
+        self._jobs: Dict[str, GenerationJob] = {}
+        self._pending: Deque[str] = deque()
+        self._running: Dict[str, int] = {}
+        self._n_running = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="generation")
+
+    def submit(
+        self,
+        account: str,
+        kind: str,
+        model_name: str,
+        params: Dict[str, Any],
+        n_variants: int,
+        job_id: str | None = None,
+    ) -> GenerationJob:
+        """Поставить задачу в очередь и сразу вернуть управление."""
+        job = GenerationJob(
+            id=job_id or uuid.uuid4().hex,
+            account=account,
+            kind=kind,
+            model_name=model_name,
+            params=dict(params),
+            n_variants=n_variants,
+        )
+        with self._lock:
+            self._jobs[job.id] = job
+            self._pending.append(job.id)
+            self._dispatch_locked()
+        return job
+
+    def get(self, job_id: str) -> GenerationJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, account: str | None = None) -> List[GenerationJob]:
+        """Задачи (аккаунта) в порядке постановки."""
+        with self._lock:
+            return [j for j in self._jobs.values() if account is None or j.account == account]
+
+    def cancel(self, job_id: str) -> None:
+        """Снять задачу: из очереди — сразу, выполняющуюся — после текущего варианта."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status not in ACTIVE_STATUSES:
+                return
+            job.cancel_requested = True
+            if job.status != QUEUED:
+                return
+            self._pending.remove(job_id)
+            self._finish_locked(job, CANCELLED)
+        self._notify(job)
+
+    def limit_for(self, model_name: str) -> int:
+        return self.model_limits.get(model_name, self.model_limit)
+
+    def _dispatch_locked(self) -> None:
+        """Запустить ожидающие задачи, для чьих моделей есть свободные слоты."""
+        for job_id in list(self._pending):
+            if self._n_running >= self.workers:
+                return
+            job = self._jobs[job_id]
+            if self._running.get(job.model_name, 0) >= self.limit_for(job.model_name):
+                continue
+            self._pending.remove(job_id)
+            self._running[job.model_name] = self._running.get(job.model_name, 0) + 1
+            self._n_running += 1
+            job.status = RUNNING
+            job.started_at = time.time()
+            self._pool.submit(self._run, job)
+
+    def _run(self, job: GenerationJob) -> None:
+        status, error = DONE, None
+        try:
+            for index in range(job.n_variants):
+                if job.cancel_requested:
+                    status = CANCELLED
+                    break
+                result = self._runner(job, index)
+                with self._lock:
+                    job.results.append(result)
+        except Exception as e:
+            status, error = FAILED, str(e)
+
+        with self._lock:
+            job.error = error
+            self._running[job.model_name] -= 1
+            self._n_running -= 1
+            self._finish_locked(job, status)
+            self._dispatch_locked()
+        self._notify(job)
+
+    def _notify(self, job: GenerationJob, attempt: int = 1) -> None:
+        """
+        Вызвать on_finish (например, закрыть резерв в журнале затрат).
+        Сбой повторяется с экспоненциальной задержкой, не блокируя поток пула;
+        после notify_attempts попыток — только лог.
+        """
+        if self._on_finish is None:
+            return
+        try:
+            self._on_finish(job)
+        except Exception:
+            if attempt >= self.notify_attempts:
+                logger.exception("on_finish задачи %s не выполнен после %d попыток", job.id, attempt)
+                return
+            logger.warning("on_finish задачи %s упал (попытка %d), повтор", job.id, attempt, exc_info=True)
+            timer = threading.Timer(
+                self.notify_backoff * (2 ** (attempt - 1)), self._notify, args=(job, attempt + 1)
+            )
+            timer.daemon = True
+            timer.start()
+
+    def _finish_locked(self, job: GenerationJob, status: str) -> None:
+        job.status = status
+        job.finished_at = time.time()
+        finished = [k for k, j in self._jobs.items() if j.status not in ACTIVE_STATUSES]
+        for key in finished[: max(len(finished) - self.keep_finished, 0)]:
+            del self._jobs[key]
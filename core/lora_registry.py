@@ -0,0 +1,148 @@
+# core/lora_registry.py
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List
+
+
+CHUNK_SIZE = 1024 * 1024
+# Заголовок safetensors больше этого считаем битым и не читаем
+_MAX_HEADER_BYTES = 16 * 1024 * 1024
+# Ключи метаданных kohya/sd-scripts с базовой моделью, по убыванию приоритета
+_BASE_MODEL_KEYS = ("ss_base_model_version", "ss_sd_model_name", "modelspec.architecture")
+
+LoraEntry = Dict[str, Any]
+
+
+def read_safetensors_metadata(path: Path) -> Dict[str, str]:
+    """__metadata__ из заголовка .safetensors (читается только заголовок, не веса)."""
+    with open(path, "rb") as f:
+        raw = f.read(8)
+        if len(raw) < 8:
+            return {}
+        (header_len,) = struct.unpack("<Q", raw)
+        if header_len > _MAX_HEADER_BYTES:
+            return {}
+        try:
+            header = json.loads(f.read(header_len))
+        except ValueError:
+            return {}
+    metadata = header.get("__metadata__") if isinstance(header, dict) else None
+    return {str(k): str(v) for k, v in metadata.items()} if isinstance(metadata, dict) else {}
+
+
+class LoraRegistry:
+    """
+    Локальный реестр LoRA-файлов.
+    Загрузка пишется на диск кусками с одновременным подсчётом sha256 — память
+    не зависит от размера файла. Файлы хранятся по хешу (blobs/<sha256>.safetensors),
+    поэтому повторная загрузка того же файла ничего не копирует.
+    Метаданные (имя, базовая модель, размер) лежат в index.json; id — префикс хеша.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.blobs = self.root / "blobs"
+        self._index_path = self.root / "index.json"
+        self._lock = threading.Lock()
+        self._index: Dict[str, LoraEntry] = self._load()
+
+    def _load(self) -> Dict[str, LoraEntry]:
+        if not self._index_path.exists():
+            return {}
+        try:
+            return json.loads(self._index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _save_locked(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self._index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._index, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self._index_path)
+
+    def ingest(
+        self,
+        stream: BinaryIO,
+        filename: str,
+        name: str | None = None,
+        base_model: str | None = None,
+        chunk_size: int = CHUNK_SIZE,
+    ) -> LoraEntry:
+        """
+        Сохранить LoRA из потока и вернуть запись реестра.
+        Если файл с таким хешем уже есть — возвращается существующая запись.
+        """
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self.blobs, suffix=".part")
+        tmp = Path(tmp_name)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    sha.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            digest = sha.hexdigest()
+            lora_id = digest[:16]
+
+            with self._lock:
+                existing = self._index.get(lora_id)
+                if existing is not None and Path(existing["path"]).exists():
+                    return dict(existing)
+
+                blob = self.blobs / f"{digest}.safetensors"
+                os.replace(tmp, blob)
+                metadata = read_safetensors_metadata(blob)
+                if base_model is None:
+                    base_model = next((metadata[k] for k in _BASE_MODEL_KEYS if k in metadata), "")
+                entry = {
+                    "id": lora_id,
+                    "sha256": digest,
+                    "name": name or metadata.get("ss_output_name") or Path(filename).stem,
+                    "filename": filename,
+                    "base_model": base_model,
+                    "size": size,
+                    "path": str(blob),
+                    "created_at": time.time(),
+                }
+                self._index[lora_id] = entry
+                self._save_locked()
+                return dict(entry)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def get(self, lora_id: str) -> LoraEntry | None:
+        with self._lock:
+            entry = self._index.get(lora_id)
+            return dict(entry) if entry is not None else None
+
+    def path(self, lora_id: str) -> Path | None:
+        """Путь к файлу LoRA по id (для бэкенда генерации)."""
+        entry = self.get(lora_id)
+        return Path(entry["path"]) if entry is not None else None
+
+    def list(self, base_model: str | None = None) -> List[LoraEntry]:
+        """Записи реестра, новые сначала (опционально — только для базовой модели)."""
+        with self._lock:
+            entries = [dict(e) for e in self._index.values()]
+        if base_model:
+            entries = [e for e in entries if e["base_model"] == base_model]
+        return sorted(entries, key=lambda e: e["created_at"], reverse=True)
+
+    def remove(self, lora_id: str) -> None:
+        with self._lock:
+            entry = self._index.pop(lora_id, None)
+            if entry is None:
+                return
+            Path(entry["path"]).unlink(missing_ok=True)
+            self._save_locked()
@@ -0,0 +1,175 @@
+# core/media_cache.py
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+
+# Параметры, от которых зависит результат генерации одного варианта
+# (n_variants не входит: вариант i одинаков при любом размере пачки)
+KEY_PARAMS = ("kind", "prompt", "model_name", "lora_id", "content_type", "subcategory")
+
+# Ссылка на внешний результат (URL) хранится как текстовый файл с этим расширением
+_REF_EXT = ".ref"
+
+
+def normalize_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Нормализация: пробелы в строках схлопываются, пустые значения — ""."""
+    normalized = {}
+    for name in KEY_PARAMS:
+        value = params.get(name)
+        if isinstance(value, str):
+            value = re.sub(r"\s+", " ", value).strip()
+        normalized[name] = "" if value is None else value
+    return normalized
+
+
+def media_key(params: Dict[str, Any], seed: int, index: int) -> str:
+    """Адрес варианта: sha256 от нормализованных параметров, seed и номера варианта."""
+    payload = json.dumps(
+        {"params": normalize_params(params), "seed": int(seed), "index": int(index)},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class MediaCache:
+    """
+    Контентно-адресуемый кеш результатов генерации на локальном диске.
+    Файл называется по ключу (root/ab/abcdef….ext); байты сохраняются как есть,
+    внешние ссылки — в .ref-файле. Производные файлы (превью) лежат рядом как
+    abcdef….<что-то>.<ext>, учитываются в размере записи и удаляются вместе с ней.
+    Общий размер ограничен max_bytes:
+    при переполнении удаляются давно не использованные записи (LRU по mtime,
+    поэтому порядок переживает перезапуск).
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[Path, int]]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._scan()
+
+    def _scan(self) -> None:
+        """Восстановить индекс по файлам на диске (от давно использованных к свежим)."""
+        if not self.root.exists():
+            return
+        files = [p for p in self.root.glob("*/*") if p.is_file() and ".tmp" not in p.name]
+        primary: Dict[str, Path] = {}
+        sizes: Dict[str, int] = {}
+        for path in files:
+            key = path.name.split(".", 1)[0]
+            sizes[key] = sizes.get(key, 0) + path.stat().st_size
+            if path.name.count(".") == 1:
+                primary[key] = path
+        for key in sorted(primary, key=lambda k: primary[k].stat().st_mtime):
+            self._entries[key] = (primary[key], sizes[key])
+            self._total += sizes[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+    def get(self, key: str, count: bool = True) -> Tuple[bool, Any]:
+        """
+        (найдено, значение): путь к файлу или сохранённая ссылка.
+        mtime и чтение — под блокировкой: иначе параллельный put может вытеснить
+        файл между проверкой и utime.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                try:
+                    os.utime(entry[0])
+                    value = self._read(entry[0])
+                except FileNotFoundError:
+                    # Файл удалили в обход кеша — считаем промахом
+                    self._drop_locked(key)
+                    entry = None
+            if entry is None:
+                self.misses += count
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += count
+            return True, value
+
+    def put(self, key: str, value: Any, ext: str = ".bin") -> Any:
+        """
+        Сохранить результат: bytes — в файл с расширением ext (возвращается путь),
+        строка (URL) — в .ref-файл (возвращается сама строка).
+        """
+        if isinstance(value, (bytes, bytearray)):
+            data, suffix = bytes(value), ext
+        else:
+            data, suffix = str(value).encode(), _REF_EXT
+        path = self.root / key[:2] / f"{key}{suffix}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            if key in self._entries:
+                old_path, old_size = self._entries.pop(key)
+                self._total -= old_size
+                if old_path != path:
+                    old_path.unlink(missing_ok=True)
+            self._entries[key] = (path, len(data))
+            self._total += len(data)
+            self._evict_locked()
+            return self._read(path)
+
+    def refresh_size(self, key: str) -> None:
+        """Пересчитать размер записи вместе с производными файлами (после создания превью)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            path = entry[0]
+            size = sum(p.stat().st_size for p in path.parent.glob(f"{key}.*") if ".tmp" not in p.name)
+            self._entries[key] = (path, size)
+            self._total += size - entry[1]
+            self._evict_locked()
+
+    def get_or_create(self, key: str, produce: Callable[[], Any], ext: str = ".bin") -> Any:
+        """Вернуть из кеша или сгенерировать; один ключ генерируется не более одного раза одновременно."""
+        found, value = self.get(key)
+        if found:
+            return value
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            found, value = self.get(key, count=False)
+            if not found:
+                value = self.put(key, produce(), ext)
+        with self._lock:
+            self._key_locks.pop(key, None)
+        return value
+
+    def _read(self, path: Path) -> Any:
+        return path.read_text() if path.suffix == _REF_EXT else str(path)
+
+    def _drop_locked(self, key: str, unlink: bool = False) -> None:
+        path, size = self._entries.pop(key)
+        self._total -= size
+        if unlink:
+            for sibling in path.parent.glob(f"{key}.*"):
+                sibling.unlink(missing_ok=True)
+
+    def _evict_locked(self) -> None:
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            self._drop_locked(oldest, unlink=True)
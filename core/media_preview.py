@@ -0,0 +1,112 @@
+# core/media_preview.py
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Dict
+
+try:
+    from PIL import Image  # ставится вместе со streamlit
+except ImportError:  # pragma: no cover
+    Image = None
+
+
+# Производные файлы лежат рядом с оригиналом: <key>.thumb.webp, <key>.poster.webp, <key>.preview.mp4
+THUMB_SUFFIX = ".thumb.webp"
+POSTER_SUFFIX = ".poster.webp"
+PREVIEW_SUFFIX = ".preview.mp4"
+
+
+def _derived(original: Path, suffix: str) -> Path:
+    return original.with_name(original.name.split(".", 1)[0] + suffix)
+
+
+def _ffmpeg() -> str | None:
+    return shutil.which("ffmpeg")
+
+
+def make_image_thumbnail(original: Path, size: int, quality: int = 70) -> Path | None:
+    """WebP-миниатюра не больше size×size (без Pillow — None)."""
+    target = _derived(original, THUMB_SUFFIX)
+    if target.exists():
+        return target
+    if Image is None:
+        return None
+    with Image.open(original) as img:
+        img.thumbnail((size, size))
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+        tmp = target.with_name(target.name + ".tmp")
+        img.save(tmp, format="WEBP", quality=quality, method=4)
+    tmp.replace(target)
+    return target
+
+
+def _run_ffmpeg(args: list, target: Path, timeout: float) -> Path | None:
+    ffmpeg = _ffmpeg()
+    if ffmpeg is None:
+        return None
+    tmp = target.with_name(target.stem + ".tmp" + target.suffix)
+    result = subprocess.run(
+        [ffmpeg, "-y", "-loglevel", "error", *args, str(tmp)],
+        capture_output=True,
+        timeout=timeout,
+    )
+    if result.returncode != 0 or not tmp.exists():
+        tmp.unlink(missing_ok=True)
+        return None
+    tmp.replace(target)
+    return target
+
+
+def make_video_poster(original: Path, size: int, timeout: float = 30.0) -> Path | None:
+    """Кадр-обложка (WebP) с первой секунды видео; без ffmpeg — None."""
+    target = _derived(original, POSTER_SUFFIX)
+    if target.exists():
+        return target
+    return _run_ffmpeg(
+        ["-ss", "1", "-i", str(original), "-frames:v", "1", "-vf", f"scale={size}:-2"],
+        target,
+        timeout,
+    )
+
+
+def make_video_preview(original: Path, size: int, seconds: int, timeout: float = 60.0) -> Path | None:
+    """Короткий превью-ролик без звука с низким битрейтом; без ffmpeg — None."""
+    target = _derived(original, PREVIEW_SUFFIX)
+    if target.exists():
+        return target
+    return _run_ffmpeg(
+        [
+            "-i", str(original), "-t", str(seconds), "-an",
+            "-vf", f"scale={size}:-2", "-c:v", "libx264", "-preset", "veryfast",
+            "-b:v", "250k", "-movflags", "+faststart",
+        ],
+        target,
+        timeout,
+    )
+
+
+def build_previews(kind: str, original: str, size: int = 320, preview_seconds: int = 3) -> Dict[str, str | None]:
+    """
+    Превью для результата генерации.
+    Возвращает {"url": оригинал, "thumb": миниатюра/обложка, "preview": ролик (для видео)}.
+    Для удалённых результатов (URL) и при отсутствии Pillow/ffmpeg превью — None,
+    и сетка показывает оригинал.
+    """
+    result: Dict[str, str | None] = {"url": original, "thumb": None, "preview": None}
+    path = Path(original)
+    if "://" in original or not path.is_file():
+        return result
+    try:
+        if kind == "image":
+            thumb = make_image_thumbnail(path, size)
+            result["thumb"] = str(thumb) if thumb else None
+        else:
+            poster = make_video_poster(path, size)
+            preview = make_video_preview(path, size, preview_seconds)
+            result["thumb"] = str(poster) if poster else None
+            result["preview"] = str(preview) if preview else None
+    except (OSError, subprocess.SubprocessError):
+        # Превью — оптимизация: битый файл или сбой ffmpeg не ломают генерацию
+        pass
+    return result
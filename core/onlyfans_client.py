@@ -1,8 +1,14 @@
 # core/onlyfans_client.py
 
-from typing import List, Dict, Any
+import asyncio
+import threading
+import zlib
+from datetime import datetime
+from typing import List, Dict, Any, Iterable
+import numpy as np
 import pandas as pd
 
+from core.transport import HttpTransport
 from core.utils import get_settings
 
 
@@ -16,7 +22,20 @@ class OnlyFansClient:
         settings = get_settings()
         self.api_key = api_key or settings.onlyfans_api_key
         self.base_url = base_url or settings.onlyfans_api_url
-        # сюда позже добавим httpx.Client / requests.Session, прокси и т.д.
+        # Пул соединений с keep-alive; без base_url работаем на заглушках
+        self.transport: HttpTransport | None = (
+            HttpTransport(self.base_url, api_key=self.api_key, settings=settings)
+            if self.base_url else None
+        )
+        # Заглушка отправленных сообщений: fan_id -> сообщения, ключ идемпотентности -> сообщение
+        self._stub_sent: Dict[int, List[Dict[str, Any]]] = {}
+        self._stub_sent_keys: Dict[str, Dict[str, Any]] = {}
+        self._stub_lock = threading.Lock()
+        self._stub_events: Dict[str, pd.DataFrame] = {}
+
+    def close(self) -> None:
+        if self.transport is not None:
+            self.transport.close()
 
     # ====== Фаны ======
 
@@ -37,27 +56,181 @@ class OnlyFansClient:
 
     # ====== Чаты ======
 
-    def fetch_chat_history(self, fan_id: int) -> List[Dict[str, Any]]:
+    def fetch_chat_history(
+        self,
+        fan_id: int,
+        before_id: int | None = None,
+        limit: int | None = None,
+        after_id: int | None = None,
+    ) -> List[Dict[str, Any]]:
         """
-        История чата: список словарей с полями role, text, time.
+        История чата: список словарей с полями id, role, text, time
+        в хронологическом порядке.
+        Курсорная пагинация: before_id — вернуть только сообщения старше него,
+        after_id — только новее него (инкрементальная синхронизация),
+        limit — не больше limit самых свежих из отобранных.
         """
         # TODO: заменить на SELECT из БД или вызов API
-        return [
-            {"role": "user", "text": "Привет, как ты?", "time": "10:01"},
-            {"role": "assistant", "text": "Хей, милашка 😘 Только проснулась, думаю о тебе.", "time": "10:02"},
-            {"role": "user", "text": "Хочу кастом видео 😈", "time": "10:05"},
+        messages = [
+            {"id": 1, "role": "user", "text": "Привет, как ты?", "time": "10:01"},
+            {"id": 2, "role": "assistant", "text": "Хей, милашка 😘 Только проснулась, думаю о тебе.", "time": "10:02"},
+            {"id": 3, "role": "user", "text": "Хочу кастом видео 😈", "time": "10:05"},
         ]
+        with self._stub_lock:
+            messages += self._stub_sent.get(int(fan_id), [])
+        if before_id is not None:
+            messages = [m for m in messages if m["id"] < before_id]
+        if after_id is not None:
+            messages = [m for m in messages if m["id"] > after_id]
+        if limit is not None:
+            messages = messages[-limit:] if limit > 0 else []
+        return messages
+
+    def send_message(self, fan_id: int, text: str, idempotency_key: str) -> Dict[str, Any]:
+        """
+        Отправить сообщение фану. Повтор с тем же idempotency_key
+        возвращает уже отправленное сообщение, а не создаёт дубль.
+        """
+        # TODO: заменить на POST к API:
+        # self.transport.post_json(f"/chats/{fan_id}/messages", {"text": text},
+        #                          headers={"Idempotency-Key": idempotency_key})
+        with self._stub_lock:
+            existing = self._stub_sent_keys.get(idempotency_key)
+            if existing is not None:
+                return existing
+            sent = self._stub_sent.setdefault(int(fan_id), [])
+            message = {
+                "id": 4 + len(sent),
+                "role": "assistant",
+                "text": text,
+                "time": datetime.now().strftime("%H:%M"),
+            }
+            sent.append(message)
+            self._stub_sent_keys[idempotency_key] = message
+            return message
 
     # ====== Аналитика ======
 
-    def fetch_analytics(self, account: str) -> pd.DataFrame:
+    def fetch_events(self, account: str, since_id: int | None = None) -> pd.DataFrame:
+        """
+        Сырые события аккаунта в порядке id (и времени):
+        id, ts, fan_id, revenue (донат/покупка), subs (новые подписки),
+        watch_minutes (длительность просмотра стрима; 0 — не просмотр).
+        since_id — вернуть только события новее него (инкрементальная догрузка).
+        """
+        # TODO: заменить на реальные события из БД/BI
+        with self._stub_lock:
+            events = self._stub_events.get(account)
+            if events is None:
+                events = _generate_stub_events(account)
+                self._stub_events[account] = events
+        mask = events["ts"].to_numpy() <= np.datetime64(pd.Timestamp.now())
+        if since_id is not None:
+            mask &= events["id"].to_numpy() > since_id
+        return events[mask].reset_index(drop=True)
+
+    # ====== Async и батчи ======
+    # Пока методы синхронные, async-версии уводят их в пул потоков;
+    # HttpTransport потокобезопасен и сам ограничивает параллелизм на хост.
+
+    async def afetch_fans(self, account: str) -> pd.DataFrame:
+        return await asyncio.to_thread(self.fetch_fans, account)
+
+    async def afetch_chat_history(
+        self,
+        fan_id: int,
+        before_id: int | None = None,
+        limit: int | None = None,
+        after_id: int | None = None,
+    ) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.fetch_chat_history, fan_id, before_id, limit, after_id)
+
+    async def afetch_events(self, account: str, since_id: int | None = None) -> pd.DataFrame:
+        return await asyncio.to_thread(self.fetch_events, account, since_id)
+
+    async def afetch_batch(
+        self,
+        method: str,
+        keys: Iterable[Any],
+        concurrency: int = 8,
+        return_exceptions: bool = False,
+        key_kwargs: Dict[Any, Dict[str, Any]] | None = None,
+    ) -> Dict[Any, Any]:
+        """
+        Параллельно вызвать afetch_<method> для каждого ключа (аккаунта или fan_id),
+        не более concurrency запросов одновременно.
+        key_kwargs — доп. аргументы по ключам (например, since_id для каждого аккаунта).
+        Возвращает {ключ: результат}; с return_exceptions=True ошибка одного ключа
+        попадает в результат и не роняет остальные.
+        """
+        fetch = getattr(self, f"afetch_{method}")
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        keys = list(dict.fromkeys(keys))
+
+        async def run(key):
+            async with semaphore:
+                return await fetch(key, **(key_kwargs or {}).get(key, {}))
+
+        results = await asyncio.gather(
+            *(run(key) for key in keys), return_exceptions=return_exceptions
+        )
+        return dict(zip(keys, results))
+
+    def fetch_batch(
+        self,
+        method: str,
+        keys: Iterable[Any],
+        concurrency: int = 8,
+        return_exceptions: bool = False,
+        key_kwargs: Dict[Any, Dict[str, Any]] | None = None,
+    ) -> Dict[Any, Any]:
         """
-        Данные для графиков: day, revenue, subs, avg_watch.
+        Синхронная обёртка над afetch_batch для кода без event loop (скрипты Streamlit).
+        Время ответа — как у самого медленного запроса, а не сумма всех.
         """
-        # TODO: заменить на реальные метрики из БД/BI
-        return pd.DataFrame({
-            "day": pd.date_range("2026-01-20", periods=7),
-            "revenue": [1200, 1800, 950, 2200, 1500, 1900, 2300],
-            "subs": [45, 52, 48, 60, 55, 62, 70],
-            "avg_watch": [18, 21, 16, 24, 20, 23, 25],
-        })
+        return asyncio.run(
+            self.afetch_batch(method, keys, concurrency, return_exceptions, key_kwargs)
+        )
+
+
+def _generate_stub_events(account: str, days: int = 120) -> pd.DataFrame:
+    """
+    Детерминированные тестовые события за последние days дней (и на сутки вперёд,
+    чтобы при инкрементальной догрузке «приходили» новые события).
+    """
+    rng = np.random.default_rng(zlib.crc32(account.encode()))
+    start = pd.Timestamp.now().normalize() - pd.Timedelta(days=days - 1)
+    day_ns = 86_400 * 10**9
+    n_days = days + 1
+
+    def timestamps(per_day: float) -> np.ndarray:
+        counts = rng.poisson(per_day, n_days)
+        day_offsets = np.repeat(np.arange(n_days, dtype=np.int64) * day_ns, counts)
+        return start.value + day_offsets + rng.integers(0, day_ns, counts.sum())
+
+    tips_ts = timestamps(30)
+    subs_ts = timestamps(55)
+    watch_ts = timestamps(60)
+
+    ts = np.concatenate([tips_ts, subs_ts, watch_ts])
+    n_tips, n_subs, n_watch = len(tips_ts), len(subs_ts), len(watch_ts)
+    revenue = np.concatenate([
+        np.round(rng.lognormal(3.5, 0.8, n_tips), 2), np.zeros(n_subs + n_watch)
+    ])
+    subs = np.concatenate([np.zeros(n_tips, np.int32), np.ones(n_subs, np.int32), np.zeros(n_watch, np.int32)])
+    watch = np.concatenate([np.zeros(n_tips + n_subs), np.round(rng.gamma(4.0, 5.0, n_watch), 1)])
+    # Донаты приходят в основном от «известных» фанов 1..5, остальное — длинный хвост
+    fan_id = np.concatenate([
+        np.where(rng.random(n_tips) < 0.4, rng.integers(1, 6, n_tips), rng.integers(6, 5000, n_tips)),
+        np.full(n_subs + n_watch, -1),
+    ])
+
+    order = np.argsort(ts, kind="stable")
+    return pd.DataFrame({
+        "id": np.arange(1, len(ts) + 1, dtype=np.int64),
+        "ts": pd.to_datetime(ts[order]),
+        "fan_id": fan_id[order].astype(np.int64),
+        "revenue": revenue[order],
+        "subs": subs[order],
+        "watch_minutes": watch[order],
+    })
@@ -0,0 +1,149 @@
+# core/outbox.py
+import logging
+import queue
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OutboxMessage:
+    key: str
+    account: str
+    fan_id: int
+    text: str
+    status: str = PENDING
+    attempts: int = 0
+    error: str | None = None
+    result: Any = None
+    created_at: float = field(default_factory=time.time)
+
+
+class Outbox:
+    """
+    Очередь исходящих сообщений: UI только ставит сообщение в очередь,
+    отправкой занимается фоновый поток с ретраями.
+    Ключ идемпотентности передаётся в API, поэтому повтор после сбоя
+    не приводит к дублю у фана, а повторный enqueue с тем же ключом игнорируется.
+    """
+
+    def __init__(
+        self,
+        sender: Callable[[str, int, str, str], Any],
+        on_sent: Callable[[OutboxMessage], None] | None = None,
+        max_attempts: int = 5,
+        backoff: float = 0.5,
+        keep_sent: int = 200,
+        keep_failed: int = 200,
+    ):
+        self._sender = sender
+        self._on_sent = on_sent
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.keep_sent = keep_sent
+        self.keep_failed = keep_failed
+        self._messages: Dict[str, OutboxMessage] = {}
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: threading.Thread | None = None
+
+    def enqueue(self, account: str, fan_id: int, text: str, key: str | None = None) -> OutboxMessage:
+        """Поставить сообщение в очередь и сразу вернуть управление."""
+        key = key or uuid.uuid4().hex
+        with self._lock:
+            existing = self._messages.get(key)
+            if existing is not None:
+                return existing
+            message = OutboxMessage(key=key, account=account, fan_id=int(fan_id), text=text)
+            self._messages[key] = message
+            self._ensure_worker()
+        self._queue.put(key)
+        return message
+
+    def retry(self, key: str) -> None:
+        """Повторить отправку сообщения в статусе failed."""
+        with self._lock:
+            message = self._messages.get(key)
+            if message is None or message.status != FAILED:
+                return
+            message.status = PENDING
+            message.attempts = 0
+            message.error = None
+            self._ensure_worker()
+        self._queue.put(key)
+
+    def dismiss(self, key: str) -> None:
+        """Убрать сообщение в статусе failed (оператор не будет его повторять)."""
+        with self._lock:
+            message = self._messages.get(key)
+            if message is not None and message.status == FAILED:
+                del self._messages[key]
+
+    def messages(self, account: str, fan_id: int) -> List[OutboxMessage]:
+        """Сообщения фана в порядке постановки (для отображения статусов)."""
+        with self._lock:
+            return [
+                m for m in self._messages.values()
+                if m.account == account and m.fan_id == int(fan_id)
+            ]
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="outbox", daemon=True)
+            self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            key = self._queue.get()
+            with self._lock:
+                message = self._messages.get(key)
+                if message is None or message.status != PENDING:
+                    continue
+                message.status = SENDING
+                message.attempts += 1
+
+            try:
+                result = self._sender(message.account, message.fan_id, message.text, message.key)
+            except Exception as e:
+                with self._lock:
+                    message.error = str(e)
+                    if message.attempts >= self.max_attempts:
+                        message.status = FAILED
+                        self._trim_locked()
+                        continue
+                    message.status = PENDING
+                # Повтор с экспоненциальной задержкой, не блокируя остальные сообщения
+                delay = self.backoff * (2 ** (message.attempts - 1))
+                timer = threading.Timer(delay, self._queue.put, args=(key,))
+                timer.daemon = True
+                timer.start()
+                continue
+
+            with self._lock:
+                message.status = SENT
+                message.result = result
+                message.error = None
+                self._trim_locked()
+            if self._on_sent is not None:
+                try:
+                    self._on_sent(message)
+                except Exception:
+                    # Сообщение уже доставлено — сбой колбэка не меняет его статус, но не теряется
+                    logger.exception("on_sent для сообщения %s упал", message.key)
+
+    def _trim_locked(self) -> None:
+        """Держать не больше keep_sent отправленных и keep_failed упавших (старые — вон)."""
+        for status, keep in ((SENT, self.keep_sent), (FAILED, self.keep_failed)):
+            done = [k for k, m in self._messages.items() if m.status == status]
+            for key in done[: max(len(done) - keep, 0)]:
+                del self._messages[key]
@@ -0,0 +1,98 @@
+# core/prefetch.py
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+
+class ChatPrefetcher:
+    """
+    Фоновый прогрев кеша историй чатов.
+    Задачи группируются по scope (сессия оператора): смена аккаунта в scope
+    отменяет ещё не начатые задачи. Очередь ограничена max_pending — лишние
+    задачи просто не ставятся, прогрев best-effort.
+    Scope, из которого scope_ttl секунд не было prefetch (сессия закрыта без выхода),
+    вычищается при следующем вызове prefetch любой сессии.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str, int, int | None], Any],
+        workers: int = 2,
+        max_pending: int = 32,
+        scope_ttl: float = 1800.0,
+    ):
+        self._loader = loader
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-prefetch")
+        self.max_pending = max_pending
+        self.scope_ttl = scope_ttl
+        self._lock = threading.Lock()
+        self._accounts: Dict[str, str] = {}
+        self._futures: Dict[str, Dict[Tuple[str, int], Future]] = {}
+        self._last_seen: Dict[str, float] = {}
+
+    def prefetch(
+        self,
+        scope: str,
+        account: str,
+        fan_ids: Iterable[int],
+        limit: int | None = None,
+    ) -> int:
+        """
+        Поставить фанов в очередь прогрева; loader вызывается как
+        loader(account, fan_id, limit). Возвращает число новых задач.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle_locked(now - self.scope_ttl)
+            self._last_seen[scope] = now
+            if self._accounts.get(scope) != account:
+                self._cancel_locked(scope)
+                self._accounts[scope] = account
+
+            for other, futures in list(self._futures.items()):
+                for key in [k for k, f in futures.items() if f.done()]:
+                    del futures[key]
+                if not futures and other != scope:
+                    del self._futures[other]
+            scope_futures = self._futures.setdefault(scope, {})
+
+            pending = sum(len(fs) for fs in self._futures.values())
+            submitted = 0
+            for fan_id in fan_ids:
+                key = (account, int(fan_id))
+                if key in scope_futures:
+                    continue
+                if pending >= self.max_pending:
+                    break
+                scope_futures[key] = self._executor.submit(self._run, scope, account, key[1], limit)
+                pending += 1
+                submitted += 1
+            return submitted
+
+    def cancel(self, scope: str) -> None:
+        """Отменить невыполненные задачи scope (например, при выходе из аккаунта)."""
+        with self._lock:
+            self._cancel_locked(scope)
+            self._accounts.pop(scope, None)
+            self._last_seen.pop(scope, None)
+
+    def _evict_idle_locked(self, before: float) -> None:
+        for scope in [s for s, seen in self._last_seen.items() if seen < before]:
+            self._cancel_locked(scope)
+            self._accounts.pop(scope, None)
+            del self._last_seen[scope]
+
+    def _cancel_locked(self, scope: str) -> None:
+        for future in self._futures.pop(scope, {}).values():
+            future.cancel()
+
+    def _run(self, scope: str, account: str, fan_id: int, limit: int | None) -> None:
+        # Аккаунт мог смениться, пока задача ждала в очереди
+        if self._accounts.get(scope) != account:
+            return
+        try:
+            self._loader(account, fan_id, limit)
+        except Exception:
+            # Прогрев не должен ронять рабочий поток; при открытии фана запрос повторится
+            pass
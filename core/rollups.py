@@ -0,0 +1,191 @@
+# core/rollups.py
+import threading
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from core.aggregation import _DAY_NS
+
+
+# Поля с суммами (для них же ведутся префиксные суммы)
+SUM_FIELDS = ("revenue", "subs", "tips", "watch_sum", "watch_count")
+# Поля с дневными минимумами/максимумами
+MINMAX_FIELDS = ("tip", "watch")
+
+
+class DailyRollup:
+    """
+    Материализованные дневные агрегаты одного аккаунта:
+    суммы, количества и min/max по дням + префиксные суммы.
+    ingest стоит O(новых событий + дней от самого раннего затронутого до конца),
+    а KPI по любому диапазону дней читаются за O(1).
+    """
+
+    def __init__(self):
+        self.first_day: int | None = None
+        self.n_days = 0
+        self._sums: Dict[str, np.ndarray] = {f: np.zeros(0) for f in SUM_FIELDS}
+        self._cum: Dict[str, np.ndarray] = {f: np.zeros(1) for f in SUM_FIELDS}
+        self._min: Dict[str, np.ndarray] = {f: np.zeros(0) for f in MINMAX_FIELDS}
+        self._max: Dict[str, np.ndarray] = {f: np.zeros(0) for f in MINMAX_FIELDS}
+        # Растёт при каждом ingest — по нему инвалидируются производные кеши
+        self.version = 0
+        self.lock = threading.Lock()
+
+    # ====== Запись ======
+
+    def _ensure_days(self, lo: int, hi: int) -> None:
+        """Расширить массивы, чтобы покрыть дни [lo, hi]."""
+        if self.first_day is None:
+            self.first_day = lo
+        prepend = max(self.first_day - lo, 0)
+        append = max(hi - (self.first_day + self.n_days - 1), 0)
+        if not prepend and not append:
+            return
+
+        def grow(arr: np.ndarray, fill: float) -> np.ndarray:
+            return np.concatenate([np.full(prepend, fill), arr, np.full(append, fill)])
+
+        for f in SUM_FIELDS:
+            self._sums[f] = grow(self._sums[f], 0.0)
+        for f in MINMAX_FIELDS:
+            self._min[f] = grow(self._min[f], np.inf)
+            self._max[f] = grow(self._max[f], -np.inf)
+        self.first_day -= prepend
+        self.n_days += prepend + append
+        for f in SUM_FIELDS:
+            # Новые дни пустые: префикс просто продлевается последним значением
+            cum = self._cum[f]
+            if prepend:
+                cum = np.concatenate([np.zeros(prepend), cum])
+            self._cum[f] = np.concatenate([cum, np.full(append, cum[-1])])
+
+    def ingest(self, events: pd.DataFrame) -> None:
+        """Учесть новые события (колонки как у OnlyFansClient.fetch_events)."""
+        if events.empty:
+            return
+        ts = events["ts"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        days = ts // _DAY_NS
+        revenue = events["revenue"].to_numpy(dtype=np.float64)
+        subs = events["subs"].to_numpy(dtype=np.float64)
+        watch = events["watch_minutes"].to_numpy(dtype=np.float64)
+        is_tip = revenue > 0
+        is_watch = watch > 0
+
+        with self.lock:
+            lo, hi = int(days.min()), int(days.max())
+            prepended = self.first_day is not None and lo < self.first_day
+            self._ensure_days(lo, hi)
+            idx = days - self.first_day
+
+            values = {
+                "revenue": revenue,
+                "subs": subs,
+                "tips": is_tip.astype(np.float64),
+                "watch_sum": watch,
+                "watch_count": is_watch.astype(np.float64),
+            }
+            for f, v in values.items():
+                np.add.at(self._sums[f], idx, v)
+            for f, v, mask in (("tip", revenue, is_tip), ("watch", watch, is_watch)):
+                np.minimum.at(self._min[f], idx[mask], v[mask])
+                np.maximum.at(self._max[f], idx[mask], v[mask])
+
+            # Пересчитываем префиксы только начиная с самого раннего затронутого дня
+            start = 0 if prepended else int(idx.min())
+            for f in SUM_FIELDS:
+                cum = self._cum[f]
+                cum[start + 1:] = cum[start] + np.cumsum(self._sums[f][start:])
+            self.version += 1
+
+    # ====== Чтение ======
+
+    def _span(self, start_day: int, end_day: int) -> tuple[int, int]:
+        """Индексы префиксов для дней [start_day, end_day), обрезанные по имеющимся данным."""
+        if self.first_day is None:
+            return 0, 0
+        lo = min(max(start_day - self.first_day, 0), self.n_days)
+        hi = min(max(end_day - self.first_day, 0), self.n_days)
+        return lo, max(hi, lo)
+
+    def total(self, field: str, start_day: int, end_day: int) -> float:
+        """Сумма поля за дни [start_day, end_day) — O(1)."""
+        with self.lock:
+            lo, hi = self._span(start_day, end_day)
+            cum = self._cum[field]
+            return float(cum[hi] - cum[lo])
+
+    def day(self, day: int) -> Dict[str, float]:
+        """Агрегаты одного дня (нули, если событий не было)."""
+        with self.lock:
+            result = {f: 0.0 for f in SUM_FIELDS}
+            result.update({f"{f}_min": 0.0 for f in MINMAX_FIELDS})
+            result.update({f"{f}_max": 0.0 for f in MINMAX_FIELDS})
+            if self.first_day is None or not 0 <= day - self.first_day < self.n_days:
+                return result
+            i = day - self.first_day
+            for f in SUM_FIELDS:
+                result[f] = float(self._sums[f][i])
+            for f in MINMAX_FIELDS:
+                if np.isfinite(self._min[f][i]):
+                    result[f"{f}_min"] = float(self._min[f][i])
+                    result[f"{f}_max"] = float(self._max[f][i])
+            return result
+
+    def series(self, field: str, start_day: int, end_day: int) -> np.ndarray:
+        """Дневной ряд поля за [start_day, end_day), пропуски — нули."""
+        with self.lock:
+            out = np.zeros(max(end_day - start_day, 0))
+            if self.first_day is None or not len(out):
+                return out
+            lo, hi = self._span(start_day, end_day)
+            offset = self.first_day + lo - start_day
+            out[offset:offset + hi - lo] = self._sums[field][lo:hi]
+            return out
+
+    def kpis(self, start_day: int, end_day: int) -> Dict[str, float]:
+        """
+        KPI для карточек аналитики за дни [start_day, end_day), всё за O(1):
+        доход за период и за предыдущий такой же период, подписки последнего
+        и предпоследнего дня, средняя длительность просмотра.
+        """
+        length = end_day - start_day
+        watch_sum = self.total("watch_sum", start_day, end_day)
+        watch_count = self.total("watch_count", start_day, end_day)
+        last_day = self.day(end_day - 1)
+        prev_day = self.day(end_day - 2)
+        return {
+            "revenue": self.total("revenue", start_day, end_day),
+            "prev_revenue": self.total("revenue", start_day - length, start_day),
+            "subs": self.total("subs", start_day, end_day),
+            "last_day_subs": last_day["subs"],
+            "prev_day_subs": prev_day["subs"],
+            "last_day_revenue": last_day["revenue"],
+            "tips": self.total("tips", start_day, end_day),
+            "avg_watch": watch_sum / watch_count if watch_count else 0.0,
+        }
+
+
+class RollupStore:
+    """DailyRollup по аккаунтам."""
+
+    def __init__(self):
+        self._rollups: Dict[str, DailyRollup] = {}
+        self._lock = threading.Lock()
+
+    def get(self, account: str) -> DailyRollup:
+        with self._lock:
+            rollup = self._rollups.get(account)
+            if rollup is None:
+                rollup = DailyRollup()
+                self._rollups[account] = rollup
+            return rollup
+
+    def ingest(self, account: str, events: pd.DataFrame) -> None:
+        self.get(account).ingest(events)
+
+
+def day_number(ts: pd.Timestamp) -> int:
+    """Номер дня от эпохи (в той же системе, что и агрегаты)."""
+    return pd.Timestamp(ts).value // _DAY_NS
@@ -0,0 +1,120 @@
+# core/topk.py
+import heapq
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.aggregation import _DAY_NS, _WEEK_SHIFT_DAYS
+
+
+class TopK:
+    """
+    Потоковый top-K по накопленным суммам.
+    Суммы только растут (донаты/покупки), поэтому достаточно min-кучи из K лидеров:
+    фан вне кучи может попасть в неё, только обогнав текущий минимум.
+    add стоит O(log K) (O(K) при обновлении лидера), top — O(K log K),
+    без сортировки всей таблицы фанов.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self.totals: Dict[int, float] = {}
+        self._heap: List[Tuple[float, int]] = []
+        self._in_heap: set = set()
+
+    def add(self, fan_id: int, amount: float) -> None:
+        total = self.totals.get(fan_id, 0.0) + amount
+        self.totals[fan_id] = total
+        if fan_id in self._in_heap:
+            for i, (_, heap_fan) in enumerate(self._heap):
+                if heap_fan == fan_id:
+                    self._heap[i] = (total, fan_id)
+                    break
+            heapq.heapify(self._heap)
+        elif len(self._heap) < self.k:
+            heapq.heappush(self._heap, (total, fan_id))
+            self._in_heap.add(fan_id)
+        elif total > self._heap[0][0]:
+            _, dropped = heapq.heapreplace(self._heap, (total, fan_id))
+            self._in_heap.discard(dropped)
+            self._in_heap.add(fan_id)
+
+    def top(self, k: int | None = None) -> List[Tuple[int, float]]:
+        """Лидеры по убыванию суммы: [(fan_id, total), ...]."""
+        leaders = sorted(self._heap, reverse=True)[: k or self.k]
+        return [(fan_id, total) for total, fan_id in leaders]
+
+
+class Leaderboard:
+    """
+    Лидерборды одного аккаунта: за всё время и по неделям.
+    Хранится max_k лидеров, запросить можно любой k <= max_k.
+    """
+
+    def __init__(self, max_k: int = 50, keep_weeks: int = 8):
+        self.max_k = max_k
+        self.keep_weeks = keep_weeks
+        self.all_time = TopK(max_k)
+        self.weeks: Dict[int, TopK] = {}
+        self.lock = threading.Lock()
+
+    def ingest(self, events: pd.DataFrame) -> None:
+        """Учесть новые донаты/покупки (события с revenue > 0 и известным fan_id)."""
+        revenue = events["revenue"].to_numpy(dtype=np.float64)
+        fan_id = events["fan_id"].to_numpy(dtype=np.int64)
+        mask = (revenue > 0) & (fan_id >= 0)
+        if not mask.any():
+            return
+        ts = events["ts"].to_numpy(dtype="datetime64[ns]").astype(np.int64)[mask]
+        weeks = (ts // _DAY_NS + _WEEK_SHIFT_DAYS) // 7
+
+        # Сначала схлопываем пачку по (неделя, фан) — в кучи идёт по одному обновлению на фана
+        batch = pd.DataFrame({"week": weeks, "fan_id": fan_id[mask], "revenue": revenue[mask]})
+        per_week = batch.groupby(["week", "fan_id"], sort=False)["revenue"].sum()
+        per_fan = per_week.groupby(level="fan_id").sum()
+
+        with self.lock:
+            for fid, amount in per_fan.items():
+                self.all_time.add(int(fid), float(amount))
+            for (week, fid), amount in per_week.items():
+                board = self.weeks.get(int(week))
+                if board is None:
+                    board = self.weeks[int(week)] = TopK(self.max_k)
+                board.add(int(fid), float(amount))
+            for week in sorted(self.weeks)[: -self.keep_weeks]:
+                del self.weeks[week]
+
+    def top(self, k: int, window: str = "all", now: pd.Timestamp | None = None) -> List[Tuple[int, float]]:
+        """
+        Топ-k фанов: window="all" — за всё время, "week" — за текущую неделю.
+        """
+        k = min(k, self.max_k)
+        with self.lock:
+            if window == "week":
+                now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+                week = (now.value // _DAY_NS + _WEEK_SHIFT_DAYS) // 7
+                board = self.weeks.get(week)
+                return board.top(k) if board is not None else []
+            return self.all_time.top(k)
+
+
+class LeaderboardStore:
+    """Leaderboard по аккаунтам."""
+
+    def __init__(self, max_k: int = 50):
+        self.max_k = max_k
+        self._boards: Dict[str, Leaderboard] = {}
+        self._lock = threading.Lock()
+
+    def get(self, account: str) -> Leaderboard:
+        with self._lock:
+            board = self._boards.get(account)
+            if board is None:
+                board = Leaderboard(self.max_k)
+                self._boards[account] = board
+            return board
+
+    def ingest(self, account: str, events: pd.DataFrame) -> None:
+        self.get(account).ingest(events)
@@ -0,0 +1,103 @@
+# core/transport.py
+import random
+import threading
+import time
+from typing import Any, Dict
+
+import httpx
+
+from core.utils import Settings, get_settings
+
+
+# Статусы, при которых запрос имеет смысл повторить
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HttpTransport:
+    """
+    Пул HTTP-соединений к API с keep-alive.
+    Один экземпляр на процесс: httpx.Client потокобезопасен и переиспользует
+    TLS-соединения между всеми сессиями Streamlit.
+    Поверх пула — лимит параллельных запросов на хост, таймауты и ретраи с backoff.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str | None = None,
+        settings: Settings | None = None,
+    ):
+        settings = settings or get_settings()
+        self.retries = settings.http_retries
+        self.backoff = settings.http_backoff
+        self.per_host_limit = settings.http_per_host_limit
+
+        headers = {"Accept": "application/json"}
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+
+        self._client = httpx.Client(
+            base_url=base_url,
+            headers=headers,
+            timeout=httpx.Timeout(
+                settings.http_read_timeout,
+                connect=settings.http_connect_timeout,
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive,
+                keepalive_expiry=settings.http_keepalive_expiry,
+            ),
+        )
+        self._host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _semaphore_for(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            sem = self._host_semaphores.get(host)
+            if sem is None:
+                sem = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_semaphores[host] = sem
+            return sem
+
+    def _sleep_before_retry(self, attempt: int, response: httpx.Response | None) -> None:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            # Экспоненциальный backoff с джиттером
+            delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+        time.sleep(min(delay, 30.0))
+
+    def request(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        """
+        Выполнить запрос через общий пул. Сетевые ошибки и статусы из
+        RETRY_STATUSES повторяются до settings.http_retries раз.
+        """
+        url = self._client.build_request(method, path).url
+        semaphore = self._semaphore_for(url.host)
+
+        attempt = 0
+        while True:
+            response = None
+            try:
+                with semaphore:
+                    response = self._client.request(method, path, **kwargs)
+            except httpx.TransportError:
+                if attempt >= self.retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    response.raise_for_status()
+                    return response
+            self._sleep_before_retry(attempt, response)
+            attempt += 1
+
+    def get_json(self, path: str, params: Dict[str, Any] | None = None) -> Any:
+        return self.request("GET", path, params=params).json()
+
+    def post_json(self, path: str, payload: Dict[str, Any], headers: Dict[str, str] | None = None) -> Any:
+        return self.request("POST", path, json=payload, headers=headers).json()
+
+    def close(self) -> None:
+        self._client.close()
@@ -1,6 +1,7 @@
 # core/utils.py
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Dict
 from pathlib import Path
 
 from dotenv import load_dotenv  # добавь python-dotenv в requirements.txt
@@ -17,11 +18,64 @@ class Settings:
     onlyfans_api_key: str | None
     onlyfans_api_url: str | None
     db_url: str | None
+    # HTTP-транспорт к API
+    http_max_connections: int = 50
+    http_max_keepalive: int = 20
+    http_keepalive_expiry: float = 30.0
+    http_per_host_limit: int = 10
+    http_connect_timeout: float = 5.0
+    http_read_timeout: float = 20.0
+    http_retries: int = 3
+    http_backoff: float = 0.3
+    # Каталог для локальной копии переписок (None — только в памяти)
+    chat_store_dir: str | None = None
+    # Максимум точек на одну линию графика (остальное прореживается)
+    chart_max_points: int = 500
+    # Очередь генерации контента: потоки и лимиты одновременных задач на модель
+    generation_workers: int = 4
+    generation_model_limit: int = 2
+    generation_model_limits: Dict[str, int] = field(default_factory=dict)
+    # Дисковый кеш сгенерированных медиа
+    media_cache_dir: str = str(Path(__file__).resolve().parent.parent / ".media_cache")
+    media_cache_max_mb: int = 2048
+    # Превью в сетке результатов: сторона миниатюры (px) и длина видео-превью (сек)
+    thumbnail_size: int = 320
+    video_preview_seconds: int = 3
+    # Реестр загруженных LoRA-файлов
+    lora_dir: str = str(Path(__file__).resolve().parent.parent / ".loras")
+    # Журнал затрат на генерацию и месячные бюджеты аккаунтов ($, 0 — без лимита)
+    cost_ledger_path: str = str(Path(__file__).resolve().parent.parent / ".cost_ledger.sqlite3")
+    generation_monthly_budget: float = 0.0
+    generation_budgets: Dict[str, float] = field(default_factory=dict)
+    cost_reservation_ttl_hours: float = 6.0
+    # Цена одного сгенерированного варианта по моделям ($) — по ней резервируется и списывается бюджет
+    generation_default_price: float = 0.004
+    generation_prices: Dict[str, float] = field(default_factory=dict)
 
 
 _settings: Settings | None = None
 
 
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_limits(name: str, cast=int) -> Dict[str, int]:
+    """Разбор вида "Base_SDXL=2,AnimePink=1"."""
+    limits = {}
+    for item in (os.getenv(name) or "").split(","):
+        key, sep, value = item.partition("=")
+        if sep and key.strip():
+            limits[key.strip()] = cast(value)
+    return limits
+
+
 def get_settings() -> Settings:
     """
     Централизованные настройки проекта.
@@ -33,5 +87,29 @@ def get_settings() -> Settings:
             onlyfans_api_key=os.getenv("ONLYFANS_API_KEY"),
             onlyfans_api_url=os.getenv("ONLYFANS_API_URL"),
             db_url=os.getenv("DB_URL"),
+            http_max_connections=_env_int("HTTP_MAX_CONNECTIONS", 50),
+            http_max_keepalive=_env_int("HTTP_MAX_KEEPALIVE", 20),
+            http_keepalive_expiry=_env_float("HTTP_KEEPALIVE_EXPIRY", 30.0),
+            http_per_host_limit=_env_int("HTTP_PER_HOST_LIMIT", 10),
+            http_connect_timeout=_env_float("HTTP_CONNECT_TIMEOUT", 5.0),
+            http_read_timeout=_env_float("HTTP_READ_TIMEOUT", 20.0),
+            http_retries=_env_int("HTTP_RETRIES", 3),
+            http_backoff=_env_float("HTTP_BACKOFF", 0.3),
+            chat_store_dir=os.getenv("CHAT_STORE_DIR"),
+            chart_max_points=_env_int("CHART_MAX_POINTS", 500),
+            generation_workers=_env_int("GENERATION_WORKERS", 4),
+            generation_model_limit=_env_int("GENERATION_MODEL_LIMIT", 2),
+            generation_model_limits=_env_limits("GENERATION_MODEL_LIMITS"),
+            media_cache_dir=os.getenv("MEDIA_CACHE_DIR") or Settings.media_cache_dir,
+            media_cache_max_mb=_env_int("MEDIA_CACHE_MAX_MB", 2048),
+            thumbnail_size=_env_int("THUMBNAIL_SIZE", 320),
+            video_preview_seconds=_env_int("VIDEO_PREVIEW_SECONDS", 3),
+            lora_dir=os.getenv("LORA_DIR") or Settings.lora_dir,
+            cost_ledger_path=os.getenv("COST_LEDGER_PATH") or Settings.cost_ledger_path,
+            generation_monthly_budget=_env_float("GENERATION_MONTHLY_BUDGET", 0.0),
+            generation_budgets=_env_limits("GENERATION_BUDGETS", float),
+            cost_reservation_ttl_hours=_env_float("COST_RESERVATION_TTL_HOURS", 6.0),
+            generation_default_price=_env_float("GENERATION_DEFAULT_PRICE", 0.004),
+            generation_prices=_env_limits("GENERATION_PRICES", float),
         )
     return _settings
@@ -0,0 +1,10 @@
+# pages/4_🗂_Portfolio.py
+import streamlit as st
+from components.portfolio_panel import render_portfolio_page
+
+def main():
+    accounts = st.session_state.get("user_data", {}).get("accounts", [])
+    render_portfolio_page(accounts)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+# tests/test_aggregation.py
+import pandas as pd
+
+from core.aggregation import EventLog, rollup
+
+
+def _events(rows):
+    return pd.DataFrame(
+        [
+            {"id": i, "ts": pd.Timestamp(ts), "fan_id": 1, "revenue": revenue, "subs": 0, "watch_minutes": 0.0}
+            for i, ts, revenue in rows
+        ]
+    )
+
+
+def test_late_event_is_not_appended_twice():
+    log = EventLog()
+    log.append(_events([
+        (1, "2024-01-01 10:00", 10.0),
+        (2, "2024-01-01 11:00", 20.0),
+        (3, "2024-01-01 12:00", 0.0),
+    ]))
+    # Позднее событие: id больше, время раньше — журнал пересортируется по ts
+    late = _events([(4, "2024-01-01 09:00", 100.0)])
+    assert len(log.append(late)) == 1
+    assert log.last_id == 4
+
+    # Повторная синхронизация с since_id=last_id не должна добавить его снова
+    assert log.append(late).empty
+    assert len(log) == 4
+
+    day = rollup(log, pd.Timestamp("2024-01-01"), pd.Timestamp("2024-01-02"))
+    assert day["revenue"].sum() == 130.0
+    assert list(log.ts) == sorted(log.ts)
@@ -0,0 +1,32 @@
+# tests/test_chat_store.py
+from core.chat_store import ChatStore
+
+
+PAGE = 50
+
+
+class _FakeApi:
+    def __init__(self, n: int):
+        self.messages = [{"id": i, "text": str(i)} for i in range(1, n + 1)]
+
+    def newer(self, after_id, limit):
+        found = [m for m in self.messages if after_id is None or m["id"] > after_id]
+        return found[-limit:] if limit else found
+
+    def older(self, before_id, limit):
+        found = [m for m in self.messages if m["id"] < before_id]
+        return found[-limit:] if limit else found
+
+
+def test_loaded_range_survives_new_messages():
+    api = _FakeApi(120)
+    store = ChatStore()
+    latest = store.latest("acc", 1, PAGE, api.newer)
+    page = store.older("acc", 1, latest[0]["id"], PAGE, api.older)
+    oldest_id = page[0]["id"]
+
+    # Пришли новые сообщения — свежая страница сдвинулась вперёд
+    api.messages += [{"id": i, "text": str(i)} for i in range(121, 124)]
+    history = store.latest("acc", 1, PAGE, api.newer, from_id=oldest_id)
+
+    assert [m["id"] for m in history] == list(range(oldest_id, 124))